@@ -1,16 +1,43 @@
-from flask import Flask, render_template, request
+import os
+from flask import Flask, Response, render_template, request, stream_with_context
+from template_cache import enable_bytecode_cache, warm_up
 
 app = Flask(__name__)
+# characters rendered before a streamed page sends a chunk
+app.config['STREAM_BUFFER_SIZE'] = 8192
 
-@app.route('/', methods=["GET", "POST"])
-def home():
+def load_workers():
+    """
+    Yields the workers one at a time, like the rows of a query.
+    """
     workers =[
     {"id": 1, "name":"Worker1", "salary":1237.99},
     {"id": 2, "name":"Worker2", "salary":5237.99},
     {"id": 3, "name":"Worker5", "salary":5237.39}
     ]
-    return render_template("html/home.html", workers=workers)
+    yield from workers
+
+def stream_page(template_name, **context):
+    """
+    Like render_template but the page is sent while it is rendered, so the
+    context can hold generators that are only consumed as the template loops
+    over them. Small pieces are buffered into STREAM_BUFFER_SIZE chunks.
+    """
+    app.update_template_context(context)
+    stream = app.jinja_env.get_template(template_name).stream(context)
+    stream.enable_buffering(app.config['STREAM_BUFFER_SIZE'])
+    return Response(stream_with_context(stream), mimetype='text/html')
+
+@app.route('/', methods=["GET", "POST"])
+def home():
+    if request.args.get('stream'):
+        return stream_page("html/home.html", workers=load_workers())
+    return render_template("html/home.html", workers=list(load_workers()))
 
 @app.route('/about', methods=["GET", "POST"])
 def about():
-    return render_template('html/about.html')
\ No newline at end of file
+    return render_template('html/about.html')
+
+# compile every template before the first request, TEMPLATE_REPORT=1 prints the times
+enable_bytecode_cache(app)
+warm_up(app, verbose=bool(os.environ.get('TEMPLATE_REPORT')))
\ No newline at end of file
@@ -0,0 +1,56 @@
+"""
+Compiles every template when the app starts instead of on the first request
+that renders it. The compiled code is written to a Jinja bytecode cache on
+disk, so the next worker or the next deploy loads it instead of parsing and
+compiling the templates again.
+
+    from template_cache import enable_bytecode_cache, warm_up
+    enable_bytecode_cache(app)
+    warm_up(app, verbose=True)
+"""
+import os
+import time
+
+from jinja2 import FileSystemBytecodeCache
+
+
+def enable_bytecode_cache(app, directory=None):
+    """
+    Stores compiled templates in directory (the TEMPLATE_CACHE_DIR config,
+    or a folder in the temp directory shared by every process of this user).
+    """
+    directory = directory or app.config.get('TEMPLATE_CACHE_DIR')
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    app.jinja_env.bytecode_cache = FileSystemBytecodeCache(directory)
+    return app.jinja_env.bytecode_cache
+
+
+def warm_up(app, verbose=False):
+    """
+    Loads every template of the app and of its blueprints into the Jinja
+    environment, nothing is rendered. Returns how long each one took and
+    whether it was compiled or read from the bytecode cache, slowest first,
+    and prints it when verbose is true.
+    """
+    env = app.jinja_env
+    cache = env.bytecode_cache
+    report = []
+    for name in env.list_templates():
+        source = 'compiled'
+        if cache is not None:
+            text, filename, _ = env.loader.get_source(env, name)
+            if cache.get_bucket(env, name, filename, text).code is not None:
+                source = 'bytecode'
+        start = time.perf_counter()
+        env.get_template(name)
+        report.append({
+            'template': name,
+            'ms': round((time.perf_counter() - start) * 1000, 3),
+            'source': source,
+        })
+    report.sort(key=lambda entry: entry['ms'], reverse=True)
+    if verbose:
+        for entry in report:
+            print(f"{entry['ms']:>9.3f}ms  {entry['source']:<8}  {entry['template']}")
+    return report
@@ -0,0 +1,180 @@
+"""
+Puts a hash of the content of every static file in its url, so the browser
+can keep the file for a year without asking the server again: a changed
+file gets another url.
+
+- url_for('static', filename='css/index.css') gives
+  /static/css/index.0f3a9c1b2d4e.css
+- the hash is removed again when the url is requested and the file is sent
+  with Cache-Control: public, max-age=31536000, immutable
+- the hashes are kept in manifest.json next to the files, so a new worker
+  only hashes the files that changed since the manifest was written
+
+    fingerprints = Fingerprints(app.static_folder, 'static')
+    fingerprints.build()
+    fingerprints.init(app)
+
+Run it to write the manifest before deploying:
+
+    python fingerprint.py app/static
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+
+from flask import g
+from werkzeug.security import safe_join
+
+MANIFEST = 'manifest.json'
+CACHE_FOREVER = 'public, max-age=31536000, immutable'
+# compressed copies, temporary and hidden files are not asked for by name
+SKIP = ('.gz', '.br', '.tmp')
+FINGERPRINTED = re.compile(r'^(?P<stem>.+)\.(?P<hash>[0-9a-f]{12})(?P<ext>\.[^./]+)?$')
+
+
+def content_hash(path):
+    digest = hashlib.blake2b(digest_size=6)
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(1 << 16), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def fingerprinted_name(name, digest):
+    directory, base = os.path.split(name)
+    stem, ext = os.path.splitext(base)
+    return '/'.join(filter(None, [directory.replace(os.sep, '/'), f'{stem}.{digest}{ext}']))
+
+
+class Fingerprints:
+    def __init__(self, directory, endpoint='static'):
+        self.directory = directory
+        self.endpoint = endpoint
+        # name -> {'url': fingerprinted name, 'mtime': ns, 'size': bytes}
+        self.files = {}
+        # fingerprinted name -> name
+        self.names = {}
+
+    @property
+    def manifest_path(self):
+        return os.path.join(self.directory, MANIFEST)
+
+    def build(self):
+        """
+        Fingerprints every file of the directory, reusing the hashes of the
+        manifest for the files that didn't change, and writes the manifest
+        when something changed.
+        Returns {name: fingerprinted name}.
+        """
+        if not os.path.isdir(self.directory):
+            return {}
+        try:
+            with open(self.manifest_path) as file:
+                self.files = json.load(file)
+        except (OSError, ValueError):
+            self.files = {}
+        manifest = self.files
+        found = {}
+        for root, _, files in os.walk(self.directory):
+            for base in files:
+                path = os.path.join(root, base)
+                name = os.path.relpath(path, self.directory).replace(os.sep, '/')
+                if name == MANIFEST or base.startswith('.') or base.endswith(SKIP):
+                    continue
+                found[name] = self.entry(name, os.stat(path))
+        self.files = found
+        self.names = {entry['url']: name for name, entry in found.items()}
+        if found == manifest:
+            # left as it is, a start where nothing changed writes nothing
+            return {name: entry['url'] for name, entry in found.items()}
+        temporary = f'{self.manifest_path}.{os.getpid()}.tmp'
+        with open(temporary, 'w') as file:
+            json.dump(found, file, indent=2, sort_keys=True)
+        os.replace(temporary, self.manifest_path)
+        return {name: entry['url'] for name, entry in found.items()}
+
+    def entry(self, name, stat):
+        entry = self.files.get(name)
+        if entry is None or (entry['mtime'], entry['size']) != (stat.st_mtime_ns, stat.st_size):
+            digest = content_hash(os.path.join(self.directory, name))
+            entry = {'url': fingerprinted_name(name, digest), 'mtime': stat.st_mtime_ns, 'size': stat.st_size}
+        return entry
+
+    def url(self, name):
+        """
+        The fingerprinted name of name, or name when it isn't a file of the
+        directory. The file is checked on every call so a file edited while
+        the app runs gets a new url.
+        """
+        path = safe_join(self.directory, name)
+        try:
+            stat = os.stat(path)
+        except (OSError, TypeError, ValueError):
+            return name
+        if not os.path.isfile(path):
+            return name
+        entry = self.entry(name, stat)
+        if self.files.get(name) is not entry:
+            old = self.files.get(name)
+            if old is not None:
+                self.names.pop(old['url'], None)
+            self.files[name] = entry
+            self.names[entry['url']] = name
+        return entry['url']
+
+    def resolve(self, filename):
+        """
+        The name of the file a requested url is for and whether the hash
+        in it is the current one. A url with the hash of an older version
+        of the file gets the file without the long caching.
+        """
+        if filename in self.names:
+            return self.names[filename], True
+        if filename in self.files:
+            return filename, False
+        directory, base = os.path.split(filename)
+        match = FINGERPRINTED.match(base)
+        if match is not None:
+            name = '/'.join(filter(None, [directory, match['stem'] + (match['ext'] or '')]))
+            if name in self.files:
+                return name, False
+        return filename, False
+
+    def add_fingerprint(self, endpoint, values):
+        if endpoint == self.endpoint and 'filename' in values:
+            values['filename'] = self.url(values['filename'])
+
+    def remove_fingerprint(self, endpoint, values):
+        if endpoint == self.endpoint and values and 'filename' in values:
+            values['filename'], g.static_immutable = self.resolve(values['filename'])
+
+    @staticmethod
+    def cache_forever(response):
+        if g.get('static_immutable') and response.status_code in (200, 206, 304):
+            response.headers['Cache-Control'] = CACHE_FOREVER
+        return response
+
+    def init(self, scaffold):
+        """
+        Registers the hooks on the app or the blueprint serving the files:
+        url_for gives fingerprinted urls, the hash is removed before the
+        static view runs and the responses are cached for a year.
+        """
+        scaffold.url_defaults(self.add_fingerprint)
+        scaffold.url_value_preprocessor(self.remove_fingerprint)
+        scaffold.after_request(self.cache_forever)
+        return self
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('directory')
+    args = parser.parse_args()
+    for name, url in sorted(Fingerprints(args.directory).build().items()):
+        print(name, url)
+
+
+if __name__ == '__main__':
+    main()
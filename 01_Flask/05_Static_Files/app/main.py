@@ -1,12 +1,33 @@
 from datetime import timedelta
 from flask import Flask, render_template, request, redirect, url_for, session, flash
 
+from fingerprint import Fingerprints
+from precompressed import Assets
+
 app = Flask(__name__)
 app.secret_key = "abcd"
+app.config["STATIC_CACHE_SIZE"] = 128
+app.config["STATIC_CACHE_MAX_FILE_SIZE"] = 64 * 1024
+
+"""
+Compress the css and js once when the app starts and let the static route
+send the copy the browser accepts, small files are kept in memory.
+"""
+assets = Assets(app.static_folder, app.config["STATIC_CACHE_SIZE"], app.config["STATIC_CACHE_MAX_FILE_SIZE"])
+assets.build()
+app.view_functions["static"] = assets.send
+
+"""
+url_for('static', ...) gives urls with a hash of the file in them, the
+browser keeps those files for a year.
+"""
+fingerprints = Fingerprints(app.static_folder, "static")
+fingerprints.build()
+fingerprints.init(app)
 
 @app.route('/')
 def home_page():
     return render_template('index.html')
 
 if __name__ == "__main__":
-    app.run(debug=True) # allow hot reloading
\ No newline at end of file
+    app.run(debug=True) # allow hot reloading
@@ -0,0 +1,255 @@
+"""
+Serves the files of a directory compressed without compressing them on
+every request. build() writes a gzip (and, when the brotli package is
+installed, a brotli) copy next to every file that gets smaller compressed,
+index.css.gz and index.css.br next to index.css, and send() picks the copy
+the client accepts from its Accept-Encoding header.
+
+- Every copy has its own strong ETag, a hash of its bytes, so a cached gzip
+  response is never revalidated against the brotli one.
+- Small files are kept in memory in a LRU cache and sent without opening
+  them again.
+
+    assets = Assets(os.path.join(app.root_path, 'static'))
+    assets.build()
+    return assets.send('css/index.css')
+
+Run it to build the copies before deploying:
+
+    python precompressed.py app/static
+"""
+import argparse
+import gzip
+import hashlib
+import io
+import json
+import mimetypes
+import os
+import threading
+from collections import OrderedDict, namedtuple
+
+from flask import abort, current_app, request, send_file
+from werkzeug.security import safe_join
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE = (
+    'text/', 'application/javascript', 'application/json', 'application/xml',
+    'image/svg+xml', 'application/wasm', 'font/ttf', 'font/otf',
+)
+
+# preferred first, brotli is smaller than gzip for the same file
+ENCODINGS = [('gzip', '.gz', lambda data: gzip.compress(data, 9, mtime=0))]
+if brotli is not None:
+    ENCODINGS.insert(0, ('br', '.br', lambda data: brotli.compress(data, quality=11)))
+SUFFIXES = tuple(suffix for _, suffix, _ in ENCODINGS)
+# the files already compressed, with the encodings that didn't make them smaller
+CHECKED = '.precompressed.json'
+
+Asset = namedtuple('Asset', 'path encoding mimetype etag mtime data')
+
+
+def file_hash(path=None, data=None):
+    digest = hashlib.blake2b(digest_size=16)
+    if data is not None:
+        digest.update(data)
+    else:
+        with open(path, 'rb') as file:
+            for block in iter(lambda: file.read(1 << 16), b''):
+                digest.update(block)
+    return digest.hexdigest()
+
+
+def is_compressible(name):
+    mimetype = mimetypes.guess_type(name)[0] or ''
+    return mimetype.startswith(COMPRESSIBLE)
+
+
+def compress_file(path):
+    """
+    Writes the compressed copies of path that are smaller than the file and
+    removes the others. A copy has the modification time of the file so a
+    copy left by an older version of the file is never sent. Returns the
+    size of every copy written.
+    """
+    with open(path, 'rb') as file:
+        data = file.read()
+    stat = os.stat(path)
+    sizes = {}
+    for encoding, suffix, compress in ENCODINGS:
+        compressed = compress(data)
+        if len(compressed) >= len(data):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+            continue
+        # written under another name first, a worker never sends half a file
+        temporary = f'{path}{suffix}.{os.getpid()}.tmp'
+        with open(temporary, 'wb') as file:
+            file.write(compressed)
+        os.utime(temporary, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        os.replace(temporary, path + suffix)
+        sizes[encoding] = len(compressed)
+    return sizes
+
+
+class FileCache:
+    """
+    The content and ETag of the max_files most recently sent files up to
+    max_file_size bytes. An entry is only used while the file keeps the
+    size and modification time it had when it was read.
+    """
+
+    def __init__(self, max_files=128, max_file_size=64 * 1024):
+        self.max_files = max_files
+        self.max_file_size = max_file_size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = self.misses = 0
+
+    def get(self, path, stat):
+        if stat.st_size > self.max_file_size or self.max_files <= 0:
+            return None
+        version = (stat.st_mtime_ns, stat.st_size)
+        with self.lock:
+            entry = self.entries.get(path)
+            if entry is not None and entry[0] == version:
+                self.entries.move_to_end(path)
+                self.hits += 1
+                return entry[1], entry[2]
+            self.misses += 1
+        with open(path, 'rb') as file:
+            data = file.read()
+        etag = file_hash(data=data)
+        with self.lock:
+            self.entries[path] = (version, data, etag)
+            self.entries.move_to_end(path)
+            while len(self.entries) > self.max_files:
+                self.entries.popitem(last=False)
+        return data, etag
+
+
+class Assets:
+    def __init__(self, directory, cache_size=128, cache_max_file_size=64 * 1024):
+        self.directory = directory
+        self.cache = FileCache(cache_size, cache_max_file_size)
+        # ETags of the files too big for the cache, hashed once per version
+        self.etags = {}
+
+    def build(self):
+        """
+        Compresses every compressible file of the directory whose copies are
+        missing or older than it. The files that don't get smaller with an
+        encoding are recorded in CHECKED, so they are not compressed again on
+        every start. Returns {name: {encoding: size}} for the files compressed.
+        """
+        checked_path = os.path.join(self.directory, CHECKED)
+        try:
+            with open(checked_path) as file:
+                checked = json.load(file)
+        except (OSError, ValueError):
+            checked = {}
+        report = {}
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                path = os.path.join(root, name)
+                if name == CHECKED or name.endswith(SUFFIXES) or name.endswith('.tmp') or not is_compressible(name):
+                    continue
+                key = os.path.relpath(path, self.directory).replace(os.sep, '/')
+                mtime = os.stat(path).st_mtime_ns
+                entry = checked.get(key)
+                not_smaller = entry['not_smaller'] if entry and entry['mtime'] == mtime else []
+                if all(encoding in not_smaller or self.variant_is_fresh(path + suffix, mtime)
+                       for encoding, suffix, _ in ENCODINGS):
+                    continue
+                report[key] = sizes = compress_file(path)
+                checked[key] = {
+                    'mtime': mtime,
+                    'not_smaller': [encoding for encoding, _, _ in ENCODINGS if encoding not in sizes],
+                }
+        if report:
+            temporary = f'{checked_path}.{os.getpid()}.tmp'
+            with open(temporary, 'w') as file:
+                json.dump(checked, file, indent=2, sort_keys=True)
+            os.replace(temporary, checked_path)
+        return report
+
+    @staticmethod
+    def variant_is_fresh(path, mtime):
+        try:
+            return os.stat(path).st_mtime_ns == mtime
+        except OSError:
+            return False
+
+    def etag(self, path, stat):
+        version = (stat.st_mtime_ns, stat.st_size)
+        known = self.etags.get(path)
+        if known is None or known[0] != version:
+            known = self.etags[path] = (version, file_hash(path))
+        return known[1]
+
+    def find(self, filename):
+        """
+        The file or the compressed copy to send for filename, 404 when it
+        does not exist or is outside of the directory.
+        """
+        path = safe_join(self.directory, filename)
+        if path is None or not os.path.isfile(path):
+            abort(404)
+        stat = os.stat(path)
+        mimetype = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        chosen, encoding = path, None
+        if is_compressible(path):
+            best = 0
+            for name, suffix, _ in ENCODINGS:
+                quality = request.accept_encodings.quality(name)
+                if quality > best and self.variant_is_fresh(path + suffix, stat.st_mtime_ns):
+                    best, chosen, encoding = quality, path + suffix, name
+        if chosen != path:
+            stat = os.stat(chosen)
+        cached = self.cache.get(chosen, stat)
+        if cached is not None:
+            data, etag = cached
+        else:
+            data, etag = None, self.etag(chosen, stat)
+        return Asset(chosen, encoding, mimetype, etag, stat.st_mtime, data)
+
+    def response(self, asset, filename, as_attachment=False, max_age=None):
+        """
+        Sends asset with its ETag, Last-Modified and Range support, from
+        memory when it is cached.
+        """
+        if max_age is None:
+            max_age = current_app.get_send_file_max_age(filename)
+        response = send_file(
+            io.BytesIO(asset.data) if asset.data is not None else asset.path,
+            mimetype=asset.mimetype,
+            as_attachment=as_attachment,
+            download_name=os.path.basename(filename),
+            conditional=True,
+            etag=asset.etag,
+            last_modified=asset.mtime,
+            max_age=max_age,
+        )
+        if asset.encoding is not None:
+            response.headers['Content-Encoding'] = asset.encoding
+        if is_compressible(filename):
+            response.vary.add('Accept-Encoding')
+        return response
+
+    def send(self, filename, **kwargs):
+        return self.response(self.find(filename), filename, **kwargs)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('directory')
+    args = parser.parse_args()
+    for name, sizes in sorted(Assets(args.directory).build().items()):
+        print(name, ' '.join(f'{encoding}={size}' for encoding, size in sizes.items()) or 'not smaller')
+
+
+if __name__ == '__main__':
+    main()
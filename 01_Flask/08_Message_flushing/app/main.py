@@ -1,5 +1,7 @@
+import os
 from datetime import timedelta
 from flask import Flask, render_template, request, redirect, url_for, session, flash
+from template_cache import enable_bytecode_cache, warm_up
 
 app = Flask(__name__)
 app.secret_key = "abcd"
@@ -38,5 +40,9 @@ def logout():
     flash(["You are logged out.", "Login again to access the Home page"], "info")
     return redirect(url_for('auth'))
 
+# compile every template before the first request, TEMPLATE_REPORT=1 prints the times
+enable_bytecode_cache(app)
+warm_up(app, verbose=bool(os.environ.get('TEMPLATE_REPORT')))
+
 if __name__ == "__main__":
     app.run(debug=True) # allow hot reloading
\ No newline at end of file
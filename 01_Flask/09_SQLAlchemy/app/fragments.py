@@ -0,0 +1,48 @@
+"""
+Cache of rendered template fragments. Every entry is stored under the table
+version it was rendered for and bump() moves to a new version when the
+table changes, so a fragment rendered before the change is never served
+again. Entries also expire after ttl seconds, so a process picks up rows
+written by another process.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+
+class FragmentCache:
+    def __init__(self, max_size=256, ttl=60):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.version = 0
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def get(self, key, render):
+        """
+        Returns the fragment cached for key at the current version, or calls
+        render() and caches what it returns.
+        """
+        with self._lock:
+            version = self.version
+            entry = self._entries.get((version, key))
+            if entry is not None and entry[0] > time.monotonic():
+                self._entries.move_to_end((version, key))
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+        fragment = render()
+        with self._lock:
+            # a fragment rendered while the table changed is not kept
+            if version == self.version:
+                self._entries[(version, key)] = (time.monotonic() + self.ttl, fragment)
+                while len(self._entries) > self.max_size:
+                    self._entries.popitem(last=False)
+        return fragment
+
+    def bump(self):
+        with self._lock:
+            self.version += 1
+            self._entries.clear()
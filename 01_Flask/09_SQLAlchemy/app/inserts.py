@@ -0,0 +1,52 @@
+"""
+INSERT statements that skip rows conflicting with a unique constraint
+instead of failing, so a duplicate is found by the insert itself rather than
+by a query before it (two round trips, and another request can insert the
+same row in between).
+"""
+from collections import Counter
+
+# SQLite builds before 3.32 allow at most 999 parameters per statement
+CHUNK_SIZE = 200
+
+
+def insert_ignore(table, dialect):
+    """
+    INSERT ... ON CONFLICT DO NOTHING on SQLite and PostgreSQL, INSERT IGNORE
+    on MySQL. Other databases get a plain INSERT.
+    """
+    if dialect.name == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+        return insert(table).on_conflict_do_nothing()
+    if dialect.name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+        return insert(table).on_conflict_do_nothing()
+    if dialect.name in ('mysql', 'mariadb'):
+        return table.insert().prefix_with('IGNORE')
+    return table.insert()
+
+
+def insert_rows(session, table, key, rows, chunk_size=CHUNK_SIZE):
+    """
+    Inserts rows (dicts) skipping the ones that conflict with an existing row
+    and returns one boolean per row, False for the skipped ones. key is a
+    unique column used to tell which rows were inserted: with RETURNING every
+    chunk is a single multi-row INSERT, without it the rows are inserted one
+    by one and the rowcount tells.
+    """
+    dialect = session.get_bind().dialect
+    statement = insert_ignore(table, dialect)
+    inserted = []
+    if getattr(dialect, 'insert_returning', False):
+        for start in range(0, len(rows), chunk_size):
+            chunk = rows[start:start + chunk_size]
+            result = session.execute(statement.values(chunk).returning(table.c[key]))
+            returned = Counter(row[0] for row in result)
+            for row in chunk:
+                # the first of two rows with the same key is the one inserted
+                inserted.append(returned[row[key]] > 0)
+                returned[row[key]] -= 1
+    else:
+        for row in rows:
+            inserted.append(session.execute(statement.values(row)).rowcount == 1)
+    return inserted
@@ -1,6 +1,15 @@
+import csv
+import io
 from datetime import timedelta
-from flask import Flask, render_template, request, redirect, url_for, session, flash
+from math import ceil
+from flask import Flask, Response, render_template, request, redirect, url_for, session, flash, jsonify, stream_with_context
 from flask_sqlalchemy import SQLAlchemy
+from markupsafe import Markup
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+from fragments import FragmentCache
+from inserts import insert_rows
+from sqlite_engine import configure
 
 app = Flask(__name__)
 app.secret_key = "abcd"
@@ -11,7 +20,17 @@ for the uri otherwise 4 slashes.
 app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///student.db'
 app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
 app.permanent_session_lifetime = timedelta(days=7)
+app.config['STUDENTS_PER_PAGE'] = 50
+# /?stream=1 reads STREAM_BATCH_SIZE students at a time and sends chunks of
+# STREAM_BUFFER_SIZE characters
+app.config['STREAM_BATCH_SIZE'] = 500
+app.config['STREAM_BUFFER_SIZE'] = 8192
+# rendered pages of the students table, dropped whenever a student is added
+app.config['FRAGMENT_CACHE_SIZE'] = 256
+app.config['FRAGMENT_CACHE_TTL'] = 60
 
+# WAL, pragmas and a connection pool for the threaded server
+configure(app)
 db = SQLAlchemy(app)
 class Students(db.Model):
     id = db.Column("id", db.Integer(), primary_key=True, nullable=False)
@@ -33,6 +52,99 @@ class Students(db.Model):
 Make sure that you call the db.create_all() so that a table will be created.
 """
 db.create_all()
+
+fragments = FragmentCache(app.config['FRAGMENT_CACHE_SIZE'], app.config['FRAGMENT_CACHE_TTL'])
+
+@event.listens_for(Students, 'after_insert')
+@event.listens_for(Students, 'after_update')
+@event.listens_for(Students, 'after_delete')
+def students_changed(mapper, connection, student):
+    object_session(student).info['students_changed'] = True
+
+@event.listens_for(Session, 'after_commit')
+def bump_students_version(db_session):
+    # bumped once the rows are visible to the other requests, not at flush
+    if db_session.info.pop('students_changed', False):
+        fragments.bump()
+
+@event.listens_for(Session, 'after_rollback')
+def forget_students_changes(db_session):
+    db_session.info.pop('students_changed', None)
+
+def students_table(page):
+    """
+    The rendered table of the students on page (from 1), cached until the
+    next student is added.
+    """
+    def render():
+        per_page = app.config['STUDENTS_PER_PAGE']
+        pages = max(1, ceil(Students.query.count() / per_page))
+        current = min(page, pages)
+        students = Students.query.order_by(Students.id).limit(per_page).offset((current - 1) * per_page).all()
+        return render_template('students.html', students=students, page=current, pages=pages)
+    return Markup(fragments.get(page, render))
+
+def stream_page(template_name, **context):
+    """
+    Like render_template but the page is sent while it is rendered, so the
+    context can hold a query that is only read as the template loops over it.
+    """
+    app.update_template_context(context)
+    stream = app.jinja_env.get_template(template_name).stream(context)
+    stream.enable_buffering(app.config['STREAM_BUFFER_SIZE'])
+    return Response(stream_with_context(stream), mimetype='text/html')
+
+STUDENT_FIELDS = ('name', 'surname', 'email', 'gender')
+
+def add_students(rows):
+    """
+    Inserts the students with INSERT ... ON CONFLICT DO NOTHING and commits,
+    returns one boolean per row, False for the duplicates.
+    """
+    try:
+        inserted = insert_rows(db.session, Students.__table__, 'name', rows)
+        if any(inserted):
+            # core inserts don't fire the mapper events
+            db.session.info['students_changed'] = True
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return inserted
+
+def read_students():
+    """
+    The rows of an uploaded csv file (the "file" field), of a text/csv body or
+    of a json array, with the name, surname, email and gender columns.
+    """
+    if 'file' in request.files:
+        return list(csv.DictReader(io.TextIOWrapper(request.files['file'].stream, encoding='utf-8-sig')))
+    if request.mimetype == 'text/csv':
+        return list(csv.DictReader(io.StringIO(request.get_data(as_text=True))))
+    data = request.get_json(silent=True)
+    if isinstance(data, list):
+        return data
+    return None
+
+@app.route('/import', methods=["POST"])
+def import_students():
+    rows = read_students()
+    if rows is None:
+        return jsonify({'message': 'Send a csv file or a json array of students.'}), 400
+    valid, invalid = [], []
+    for index, row in enumerate(rows):
+        if not isinstance(row, dict) or not all(isinstance(row.get(field), str) and row[field].strip() for field in STUDENT_FIELDS):
+            invalid.append(index)
+        else:
+            valid.append((index, {field: row[field].strip() for field in STUDENT_FIELDS}))
+    inserted = add_students([row for _, row in valid]) if valid else []
+    return jsonify({
+        'rows': len(rows),
+        'created': sum(inserted),
+        'duplicates': [{'row': index, 'name': row['name']} for (index, row), ok in zip(valid, inserted) if not ok],
+        'invalid': invalid,
+    }), 200
+
 @app.route('/', methods=["GET", "POST"])
 def home():
     if request.method == "POST":
@@ -41,19 +153,21 @@ def home():
         email = request.form["email"]
         gender = request.form["gender"]
 
-        found_user = Students.query.filter_by(name=name).first()
         """
-        We don't want to add students with the same name.
+        We don't want to add students with the same name. The insert skips a
+        student whose name is taken, so there is no need to look it up first.
         """
-        if found_user:
+        inserted, = add_students([{'name': name, 'surname': surname, 'email': email, 'gender': gender}])
+        if not inserted:
             flash("You can not add students with the same name.", "info")
         else:
-            student = Students(name, email, gender, surname)
-            db.session.add(student)
-            db.session.commit()
             flash(f"{name} was added to our database.")
-    students =Students.query.all() 
-    return render_template('index.html', students=students)
+    elif request.args.get('stream'):
+        # every student on one page, read from the database while it is sent
+        students = Students.query.order_by(Students.id).yield_per(app.config['STREAM_BATCH_SIZE'])
+        return stream_page('index.html', students=students)
+    page = max(1, request.args.get('page', 1, type=int))
+    return render_template('index.html', students_table=students_table(page))
 if __name__ == "__main__":
     db.create_all()
     app.run(debug=True) # allow hot reloading
\ No newline at end of file
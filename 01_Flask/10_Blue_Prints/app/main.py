@@ -1,6 +1,8 @@
+import os
 from datetime import timedelta
 from flask import Flask, render_template, request, redirect, url_for, session, flash
 from users.blueprint import blueprint
+from template_cache import enable_bytecode_cache, warm_up
 
 app = Flask(__name__)
 app.register_blueprint(blueprint, url_prefix="/users")
@@ -8,5 +10,10 @@ app.register_blueprint(blueprint, url_prefix="/users")
 @app.route('/')
 def home(): 
     return "Home"
+
+# compile every template before the first request, TEMPLATE_REPORT=1 prints the times
+enable_bytecode_cache(app)
+warm_up(app, verbose=bool(os.environ.get('TEMPLATE_REPORT')))
+
 if __name__ == "__main__":
     app.run(debug=True) # allow hot reloading
\ No newline at end of file
@@ -1,11 +1,17 @@
 from flask import Blueprint, render_template
+from fingerprint import Fingerprints
 
 blueprint = Blueprint("blueprint",__name__, static_folder="static", template_folder="templates")
 
+# fingerprinted urls for the files of the static folder, cached for a year
+fingerprints = Fingerprints(blueprint.static_folder, "blueprint.static")
+fingerprints.build()
+fingerprints.init(blueprint)
+
 @blueprint.route('/')
 def home():
     return render_template('index.html')
 
 @blueprint.route('/test')
 def test():
-    return "Test"
\ No newline at end of file
+    return "Test"
@@ -0,0 +1,80 @@
+"""
+Sends the files of a directory as downloads without keeping a worker busy
+for the whole transfer.
+
+- Range and If-Range requests are answered with 206 Partial Content, so a
+  download that was cut can be resumed instead of started again.
+- On servers that send files with sendfile() (gunicorn does it for
+  wsgi.file_wrapper) the bytes go from the file to the socket in the kernel,
+  also for ranges.
+- With DOWNLOAD_OFFLOAD set to "x-accel-redirect" (nginx) or "x-sendfile"
+  (apache, lighttpd) the app only checks the path and the proxy sends the file.
+- Otherwise the files come from precompressed.Assets: compressed when the
+  client accepts it and from memory when they are small.
+
+    from downloads import send_download
+    return send_download(assets, file_name)
+"""
+import mimetypes
+import os
+from urllib.parse import quote
+
+from flask import abort, current_app, request, send_from_directory
+from werkzeug.security import safe_join
+
+# servers whose wsgi.file_wrapper sends from the current offset of the file
+# and stops after Content-Length bytes
+SENDFILE_SERVERS = ('gunicorn',)
+
+
+def accel_redirect(file_name):
+    """
+    An empty response telling nginx to send file_name from the internal
+    location X_ACCEL_PREFIX, which must point to the download directory.
+    nginx answers the Range and conditional requests itself.
+    """
+    response = current_app.response_class()
+    response.headers['X-Accel-Redirect'] = current_app.config['X_ACCEL_PREFIX'] + quote(file_name)
+    response.headers['Content-Type'] = mimetypes.guess_type(file_name)[0] or 'application/octet-stream'
+    response.headers.set('Content-Disposition', 'attachment', filename=os.path.basename(file_name))
+    return response
+
+
+def sendfile_range(response, path):
+    """
+    Werkzeug sends a range by reading the file in Python. On servers that
+    use sendfile() for wsgi.file_wrapper the file is given to the server
+    positioned at the start of the range instead, and the server sends
+    Content-Length bytes from there.
+    """
+    file_wrapper = request.environ.get('wsgi.file_wrapper')
+    server = request.environ.get('SERVER_SOFTWARE', '')
+    if response.status_code != 206 or file_wrapper is None or not server.startswith(SENDFILE_SERVERS):
+        return response
+    file = open(path, 'rb')
+    file.seek(response.content_range.start)
+    response.response.close()
+    response.response = file_wrapper(file, 8192)
+    return response
+
+
+def send_download(assets, file_name):
+    """
+    Sends file_name from the directory of assets (precompressed.Assets) as
+    an attachment, 404 when it does not exist or is outside of the directory.
+    """
+    path = safe_join(assets.directory, file_name)
+    if path is None or not os.path.isfile(path):
+        abort(404)
+    if current_app.config.get('DOWNLOAD_OFFLOAD') == 'x-accel-redirect':
+        return accel_redirect(file_name)
+    if current_app.config.get('USE_X_SENDFILE'):
+        # X-Sendfile, the proxy answers the Range requests
+        return send_from_directory(assets.directory, path=file_name, as_attachment=True, conditional=False)
+    # the compressed copy the client accepts or the file, with an ETag and
+    # Last-Modified so that Range and If-Range requests can be answered
+    asset = assets.find(file_name)
+    response = assets.response(asset, file_name, as_attachment=True)
+    if asset.data is None:
+        sendfile_range(response, asset.path)
+    return response
@@ -1,20 +1,34 @@
 import os
-from flask import Flask, request, abort, send_from_directory
+from flask import Flask
+
+from downloads import send_download
+from precompressed import Assets
 
 app = Flask(__name__)
 app.config["ENV"] = "development"
+"""
+Set DOWNLOAD_OFFLOAD to "x-accel-redirect" behind nginx or to "x-sendfile"
+behind apache so the proxy sends the files instead of the app.
+X_ACCEL_PREFIX is the internal nginx location pointing to the images directory.
+"""
+app.config["DOWNLOAD_OFFLOAD"] = os.environ.get("DOWNLOAD_OFFLOAD")
+app.config["X_ACCEL_PREFIX"] = os.environ.get("X_ACCEL_PREFIX", "/protected/images/")
+app.config["USE_X_SENDFILE"] = app.config["DOWNLOAD_OFFLOAD"] == "x-sendfile"
+app.config["DOWNLOAD_CACHE_SIZE"] = 64
+app.config["DOWNLOAD_CACHE_MAX_FILE_SIZE"] = 256 * 1024
+
+"""
+Compressed copies of the compressible files are written once when the app
+starts, the images are already compressed and are sent as they are.
+"""
+images = Assets(os.path.join(app.root_path, "images"), app.config["DOWNLOAD_CACHE_SIZE"], app.config["DOWNLOAD_CACHE_MAX_FILE_SIZE"])
+images.build()
 
 @app.route('/download/<string:file_name>')
 def download_1(file_name): 
-    try:
-        return send_from_directory("./images", path=file_name, as_attachment=True)
-    except FileNotFoundError:
-            abort(404)
+    return send_download(images, file_name)
 @app.route('/download2/<path:file_name>')
 def download_2(file_name): 
-    try:
-        return send_from_directory("./images", path=file_name, as_attachment=True)
-    except FileNotFoundError:
-            abort(404)
+    return send_download(images, file_name)
 if __name__ == "__main__":
-    app.run(debug=True)
\ No newline at end of file
+    app.run(debug=True)
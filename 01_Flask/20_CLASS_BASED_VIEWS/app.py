@@ -1,9 +1,15 @@
 from datetime import datetime
 import imp
-from models import db, Todo
+from models import db, Todo, todos_version
+from pagination import InvalidParameter, paginate, parse_bool, parse_limit, sorted_query
+from streaming import json_document, ndjson
+from batch import InvalidBatch, TodoBatch
+from conditional import (collection_validators, not_modified, not_modified_response,
+                         precondition_failed, todo_validators, with_validators)
+from sqlalchemy.orm.exc import StaleDataError
 from flask.views import MethodView
 from app import app
-from flask import jsonify, make_response, request
+from flask import Response, jsonify, make_response, request, stream_with_context
 
 
 class TodoView(MethodView):
@@ -11,22 +17,19 @@ class TodoView(MethodView):
     def get(self, id):
         try:
             if id is None:
-                todos = [todo.to_json() for todo in Todo.query.all()]
-                return make_response(jsonify({
-                    'timestamp': datetime.now(),
-                    'code': 200,
-                    'message': "Getting all todos.",
-                    'todos': todos
-                 })), 200
+                return self.list_todos()
             else:
                 todo =Todo.query.filter_by(id=id).first()
                 if todo:
-                    return make_response(jsonify({
+                    etag, last_modified = todo_validators(todo)
+                    if not_modified(etag, last_modified):
+                        return not_modified_response(etag, last_modified)
+                    return with_validators(make_response(jsonify({
                         'timestamp': datetime.now(),
                         'code': 200,
                         'message': "Getting a single todo.",
                         'todos': todo.to_json()
-                    })), 200
+                    })), etag, last_modified), 200
                 else:
                     return make_response(jsonify({
                         'timestamp': datetime.now(),
@@ -34,6 +37,12 @@ class TodoView(MethodView):
                         'message': f"Todo of id '{id}' was not found.",
                         'todos': None
                     })), 404
+        except InvalidParameter as e:
+            return make_response(jsonify({
+                    'timestamp': datetime.now(),
+                    'code': 400,
+                    'message': str(e)
+                 })), 400
         except Exception as e:
             print(e)
             return make_response(jsonify({
@@ -41,7 +50,73 @@ class TodoView(MethodView):
                     'code': 500,
                     'message': "Internal Server Error."
                  })), 500
-        
+
+    def list_todos(self):
+        """
+        GET /api/v1/todo?limit=50&cursor=...&completed=true&sort=-created_at
+
+        Returns a page of todos and the cursor of the next page, pass it back
+        as ?cursor= to get the next one. ?all=true returns every todo at once,
+        which is only meant for small tables, and ?stream=json or
+        ?stream=ndjson streams every todo whatever the size of the table.
+        """
+        args = request.args
+        sort = args.get('sort', 'id')
+        completed = parse_bool('completed', args.get('completed'))
+        query = Todo.query
+        if completed is not None:
+            query = query.filter(Todo.completed == completed)
+        # answer polling clients that are up to date before loading any todo
+        etag, last_modified = collection_validators(todos_version)
+        if not_modified(etag, last_modified):
+            return not_modified_response(etag, last_modified)
+        if args.get('stream'):
+            res = self.stream_todos(query, sort, args.get('stream'))
+            return with_validators(res, etag, last_modified)
+        if parse_bool('all', args.get('all')):
+            query, _ = sorted_query(query, Todo, sort)
+            todos = [todo.to_json() for todo in query.all()]
+            return with_validators(make_response(jsonify({
+                'timestamp': datetime.now(),
+                'code': 200,
+                'message': "Getting all todos.",
+                'todos': todos
+             })), etag, last_modified), 200
+        limit = parse_limit(args.get('limit'), app.config['TODO_PAGE_SIZE'], app.config['TODO_MAX_PAGE_SIZE'])
+        todos, next_cursor = paginate(query, Todo, sort, args.get('cursor'), limit)
+        return with_validators(make_response(jsonify({
+            'timestamp': datetime.now(),
+            'code': 200,
+            'message': "Getting todos.",
+            'todos': [todo.to_json() for todo in todos],
+            'limit': limit,
+            'next_cursor': next_cursor
+         })), etag, last_modified), 200
+
+    def stream_todos(self, query, sort, format):
+        query, _ = sorted_query(query, Todo, sort)
+        batch_size = app.config['TODO_STREAM_BATCH_SIZE']
+        serialize = lambda todo: todo.to_json()
+        if format == 'ndjson':
+            body = ndjson(query, serialize, batch_size)
+            mimetype = 'application/x-ndjson'
+        elif format == 'json':
+            body = json_document({
+                'timestamp': datetime.now(),
+                'code': 200,
+                'message': "Getting all todos.",
+            }, 'todos', query, serialize, batch_size)
+            mimetype = 'application/json'
+        else:
+            raise InvalidParameter('"stream" must be json or ndjson.')
+        return Response(stream_with_context(body), 200, mimetype=mimetype)
+
+    def precondition_failed(self, id):
+        return make_response(jsonify({
+            'timestamp': datetime.now(),
+            'code': 412,
+            'message': f"Todo of id '{id}' was changed, get it again before changing it."
+        })), 412
 
     def post(self):
         if request.is_json:
@@ -73,6 +148,8 @@ class TodoView(MethodView):
         try:
             todo =Todo.query.filter_by(id=id).first()
             if todo:
+                if precondition_failed(todo_validators(todo)[0]):
+                    return self.precondition_failed(id)
                 if request.is_json:
                     try:
                         data = request.get_json()
@@ -80,12 +157,17 @@ class TodoView(MethodView):
                         todo.completed = data.get('completed') if data.get('completed') else todo.completed
                         db.session.add(todo)
                         db.session.commit()
-                        return make_response(jsonify({
+                        etag, last_modified = todo_validators(todo)
+                        return with_validators(make_response(jsonify({
                             'timestamp': datetime.now(),
                             'code': 200,
                             'message': "Updated Todo.",
                             'todo': todo.to_json()
-                        })), 200
+                        })), etag, last_modified), 200
+                    except StaleDataError:
+                        # updated by another request since it was loaded
+                        db.session.rollback()
+                        return self.precondition_failed(id)
                     except Exception as e:
                         print(e)
                         return make_response(jsonify({
@@ -119,8 +201,14 @@ class TodoView(MethodView):
         try:
             todo =Todo.query.filter_by(id=id).first()
             if todo:
+                if precondition_failed(todo_validators(todo)[0]):
+                    return self.precondition_failed(id)
                 db.session.delete(todo)
-                db.session.commit()
+                try:
+                    db.session.commit()
+                except StaleDataError:
+                    db.session.rollback()
+                    return self.precondition_failed(id)
                 return make_response(jsonify({
                     'timestamp': datetime.now(),
                     'code': 204,
@@ -143,6 +231,51 @@ class TodoView(MethodView):
                  })), 500
         
  
+class TodoBatchView(MethodView):
+    def post(self):
+        """
+        POST /api/v1/todo/batch with {"operations": [...]} where every
+        operation is one of
+
+            {"op": "create", "title": "...", "completed": false}
+            {"op": "update", "id": 2, "title": "...", "completed": true}
+            {"op": "delete", "id": 2}
+
+        All of them run in one transaction and the response has one result
+        per operation.
+        """
+        if not request.is_json:
+            return make_response(jsonify({
+                'timestamp': datetime.now(),
+                'code': 500,
+                'message': "Only JSON data is allowed."
+            })), 500
+        try:
+            data = request.get_json()
+            operations = data.get('operations') if isinstance(data, dict) else data
+            results = TodoBatch(db.session, Todo, app.config['TODO_BATCH_MAX_SIZE']).apply(operations)
+            applied = sum(1 for result in results if result['code'] < 300)
+            return make_response(jsonify({
+                'timestamp': datetime.now(),
+                'code': 200,
+                'message': f"Applied {applied} of {len(results)} operations.",
+                'results': results
+            })), 200
+        except InvalidBatch as e:
+            return make_response(jsonify({
+                'timestamp': datetime.now(),
+                'code': 400,
+                'message': str(e)
+            })), 400
+        except Exception as e:
+            print(e)
+            return make_response(jsonify({
+                    'timestamp': datetime.now(),
+                    'code': 500,
+                    'message': "Internal Server Error."
+                 })), 500
+
+
 """
 We are going to create a todo_view based on the TodoView because when
 we add the url_rule we need a view_func.
@@ -161,6 +294,8 @@ app.add_url_rule('/api/v1/todo', methods=['GET'],
                  defaults={'id' : None}, view_func=todo_view)
 app.add_url_rule('/api/v1/todo/<int:id>', 
                  methods=['GET', 'PUT', 'DELETE'], view_func=todo_view)
+app.add_url_rule('/api/v1/todo/batch', methods=['POST'],
+                 view_func=TodoBatchView.as_view('todo_batch_api'))
 
 
 if __name__ == "__main__":
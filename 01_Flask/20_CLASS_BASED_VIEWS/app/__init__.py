@@ -10,4 +10,13 @@ for the uri otherwise 4 slashes.
 """
 app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///student.db'
 app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
-app.permanent_session_lifetime = timedelta(days=7)
\ No newline at end of file
+app.permanent_session_lifetime = timedelta(days=7)
+
+# GET /api/v1/todo returns TODO_PAGE_SIZE todos per page unless ?limit= asks
+# for another size (at most TODO_MAX_PAGE_SIZE), or all of them with ?all=true.
+app.config['TODO_PAGE_SIZE'] = 50
+app.config['TODO_MAX_PAGE_SIZE'] = 500
+# ?stream=json|ndjson loads and sends TODO_STREAM_BATCH_SIZE todos at a time.
+app.config['TODO_STREAM_BATCH_SIZE'] = 500
+# Operations accepted by one POST /api/v1/todo/batch.
+app.config['TODO_BATCH_MAX_SIZE'] = 1000
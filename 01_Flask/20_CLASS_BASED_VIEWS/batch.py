@@ -0,0 +1,134 @@
+"""
+Applies a list of create/update/delete operations on the todos in a single
+transaction. Instead of one lookup and one commit per operation the batch
+costs one query to check which ids exist, one flush for all the inserts, one
+UPDATE ... WHERE id IN (...) per distinct set of changes, one
+DELETE ... WHERE id IN (...) and one commit.
+"""
+from sqlalchemy import func
+
+OPERATIONS = ('create', 'update', 'delete')
+# SQLite builds before 3.32 allow at most 999 parameters per statement
+IN_CHUNK_SIZE = 500
+
+
+class InvalidBatch(ValueError):
+    pass
+
+
+def in_chunks(ids):
+    ids = list(ids)
+    for start in range(0, len(ids), IN_CHUNK_SIZE):
+        yield ids[start:start + IN_CHUNK_SIZE]
+
+
+def changes_of(operation):
+    changes = {}
+    if 'title' in operation:
+        if not isinstance(operation['title'], str) or not operation['title']:
+            return None, '"title" must be a non empty string.'
+        changes['title'] = operation['title']
+    if 'completed' in operation:
+        if not isinstance(operation['completed'], bool):
+            return None, '"completed" must be true or false.'
+        changes['completed'] = operation['completed']
+    return changes, None
+
+
+def result(index, op, code, message, **extra):
+    return {'index': index, 'op': op, 'code': code, 'message': message, **extra}
+
+
+class TodoBatch:
+    def __init__(self, session, model, max_size=1000):
+        self.session = session
+        self.model = model
+        self.max_size = max_size
+
+    def apply(self, operations):
+        """
+        Returns one result per operation, in the same order. Invalid
+        operations and ids that don't exist are reported and skipped, any
+        database error rolls the whole batch back.
+        """
+        if not isinstance(operations, list):
+            raise InvalidBatch('"operations" must be a list.')
+        if len(operations) > self.max_size:
+            raise InvalidBatch(f'At most {self.max_size} operations are allowed per batch.')
+
+        model = self.model
+        referenced = {
+            operation.get('id') for operation in operations
+            if isinstance(operation, dict) and isinstance(operation.get('id'), int)
+        }
+        existing = set()
+        for ids in in_chunks(referenced):
+            existing.update(id for id, in self.session.query(model.id).filter(model.id.in_(ids)))
+
+        results = [None] * len(operations)
+        creates = []
+        updates = {}
+        deletes = set()
+        for index, operation in enumerate(operations):
+            op = operation.get('op') if isinstance(operation, dict) else None
+            if op not in OPERATIONS:
+                results[index] = result(index, op, 400, '"op" must be create, update or delete.')
+                continue
+            changes, error = changes_of(operation)
+            if error:
+                results[index] = result(index, op, 400, error)
+                continue
+            if op == 'create':
+                if 'title' not in changes:
+                    results[index] = result(index, op, 400, '"title" is required.')
+                    continue
+                creates.append((index, model(changes['title'], changes.get('completed', False))))
+                continue
+            id = operation.get('id')
+            if id not in existing or id in deletes:
+                results[index] = result(index, op, 404, f"Todo of id '{id}' was not found.", id=id)
+            elif op == 'update':
+                if not changes:
+                    results[index] = result(index, op, 400, 'Nothing to update.', id=id)
+                    continue
+                # later updates of the same todo win, like they would one by one
+                updates.setdefault(id, {}).update(changes)
+                results[index] = result(index, op, 200, 'Updated Todo.', id=id)
+            else:
+                updates.pop(id, None)
+                deletes.add(id)
+                results[index] = result(index, op, 204, f'Deleted todo of id {id}.', id=id)
+
+        try:
+            created = []
+            if creates:
+                self.session.add_all([todo for _, todo in creates])
+                self.session.flush()
+                created = [(index, todo.id) for index, todo in creates]
+            groups = {}
+            for id, changes in updates.items():
+                groups.setdefault(tuple(sorted(changes.items())), []).append(id)
+            for changes, ids in groups.items():
+                # bulk updates don't bump the version column by themselves
+                values = dict(changes, updated_at=func.now(), version=model.version + 1)
+                for chunk in in_chunks(ids):
+                    self.session.query(model).filter(model.id.in_(chunk)).update(
+                        values, synchronize_session=False)
+            for chunk in in_chunks(deletes):
+                self.session.query(model).filter(model.id.in_(chunk)).delete(synchronize_session=False)
+            self.session.commit()
+        except Exception:
+            self.session.rollback()
+            raise
+
+        # load every created and updated todo with one query per chunk
+        todos = {}
+        for ids in in_chunks([id for _, id in created] + list(updates)):
+            todos.update((todo.id, todo) for todo in self.session.query(model).filter(model.id.in_(ids)))
+        for index, id in created:
+            results[index] = result(index, 'create', 201, 'Created Todo.', id=id, todo=todos[id].to_json())
+        for entry in results:
+            # todos deleted by a later operation of the batch have nothing to show
+            if entry['op'] == 'update' and entry['code'] == 200 and entry['id'] in todos:
+                entry['todo'] = todos[entry['id']].to_json()
+        return results
@@ -0,0 +1,133 @@
+"""
+Read/write throughput of a SQLite database under concurrent load, with the
+default engine and with the settings of sqlite_engine.py. Reader threads
+select todos by id while writer threads update them, one transaction per
+statement like the routes do, and the results are printed as json.
+
+    python benchmark.py
+    python benchmark.py --readers 8 --writers 4 --seconds 10 --rows 100000
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.exc import OperationalError
+
+from sqlite_engine import PRAGMAS, engine_options, pragmas_listener
+
+READ = text('SELECT id, title, completed, updated_at FROM todo WHERE id = :id')
+WRITE = text('UPDATE todo SET completed = NOT completed, updated_at = CURRENT_TIMESTAMP WHERE id = :id')
+
+
+def create_database(path, rows):
+    engine = create_engine(f'sqlite:///{path}')
+    with engine.begin() as connection:
+        connection.execute(text(
+            'CREATE TABLE todo (id INTEGER PRIMARY KEY, title VARCHAR(80) NOT NULL, '
+            'completed BOOLEAN NOT NULL, updated_at DATETIME DEFAULT CURRENT_TIMESTAMP)'))
+        connection.execute(text('INSERT INTO todo (title, completed) VALUES (:title, 0)'),
+                           [{'title': f'todo {i}'} for i in range(rows)])
+    engine.dispose()
+
+
+def make_engine(profile, path):
+    if profile == 'default':
+        return create_engine(f'sqlite:///{path}')
+    engine = create_engine(f'sqlite:///{path}', **engine_options(pool_size=16, max_overflow=16))
+    event.listen(engine, 'connect', pragmas_listener(PRAGMAS))
+    return engine
+
+
+def worker(engine, statement, rows, deadline, seed, results):
+    rng = random.Random(seed)
+    done, errors, latencies = 0, 0, []
+    while time.monotonic() < deadline:
+        start = time.perf_counter()
+        try:
+            with engine.begin() as connection:
+                result = connection.execute(statement, {'id': rng.randint(1, rows)})
+                if result.returns_rows:
+                    result.fetchall()
+            done += 1
+            latencies.append(time.perf_counter() - start)
+        except OperationalError:
+            errors += 1
+    results.append((done, errors, latencies))
+
+
+def percentile(values, p):
+    if not values:
+        return None
+    values = sorted(values)
+    return round(values[min(len(values) - 1, int(p / 100 * (len(values) - 1)))] * 1000, 3)
+
+
+def summarize(results, seconds):
+    latencies = [latency for _, _, worker_latencies in results for latency in worker_latencies]
+    done = sum(r[0] for r in results)
+    return {
+        'ops_per_s': round(done / seconds, 1),
+        'errors': sum(r[1] for r in results),
+        'p50_ms': percentile(latencies, 50),
+        'p99_ms': percentile(latencies, 99),
+        'max_ms': percentile(latencies, 100),
+    }
+
+
+def run(profile, template, args):
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, 'todo.db')
+    shutil.copy(template, path)
+    engine = make_engine(profile, path)
+    reads, writes = [], []
+    deadline = time.monotonic() + args.seconds
+    threads = [
+        threading.Thread(target=worker, args=(engine, READ, args.rows, deadline, i, reads))
+        for i in range(args.readers)
+    ] + [
+        threading.Thread(target=worker, args=(engine, WRITE, args.rows, deadline, -i - 1, writes))
+        for i in range(args.writers)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    with engine.connect() as connection:
+        journal_mode = connection.execute(text('PRAGMA journal_mode')).scalar()
+    engine.dispose()
+    shutil.rmtree(directory)
+    return {
+        'profile': profile,
+        'journal_mode': journal_mode,
+        'pool': type(engine.pool).__name__,
+        'reads': summarize(reads, args.seconds),
+        'writes': summarize(writes, args.seconds),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--readers', type=int, default=8)
+    parser.add_argument('--writers', type=int, default=2)
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--rows', type=int, default=10000)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    template = os.path.join(directory, 'template.db')
+    try:
+        create_database(template, args.rows)
+        reports = [run(profile, template, args) for profile in ('default', 'tuned')]
+    finally:
+        shutil.rmtree(directory)
+    print(json.dumps(reports, indent=2))
+
+
+if __name__ == '__main__':
+    main()
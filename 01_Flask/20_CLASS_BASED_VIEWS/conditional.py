@@ -0,0 +1,114 @@
+"""
+ETag and Last-Modified validators for the todo routes. They are computed
+from a todo's version (or from the version of the collection) so a client
+that already has the current representation gets a 304 before anything is
+serialized.
+"""
+import secrets
+import threading
+from datetime import timezone
+from hashlib import sha1
+
+from flask import make_response, request
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+
+
+def make_etag(*parts):
+    return sha1('|'.join(str(part) for part in parts).encode()).hexdigest()[:20]
+
+
+def todo_validators(todo):
+    return make_etag('todo', todo.id, todo.version, todo.created_at), todo.updated_at
+
+
+class CollectionVersion:
+    """
+    A number bumped after every commit that inserts, updates or deletes rows
+    of model, so the tag of a collection costs no query. The changes are
+    recorded at flush and the version only moves once they are committed.
+
+    The version is kept in the process, with a token picked on startup so a
+    tag given out before a restart never matches. Rows written by another
+    process don't bump it.
+    """
+
+    def __init__(self, model):
+        self.key = f'{model.__tablename__}_changed'
+        self.token = secrets.token_hex(8)
+        self.value = 0
+        self._lock = threading.Lock()
+        for name in ('after_insert', 'after_update', 'after_delete'):
+            event.listen(model, name, self.row_changed)
+        for name in ('after_bulk_update', 'after_bulk_delete'):
+            event.listen(Session, name, lambda context: self.bulk_changed(context, model))
+        event.listen(Session, 'after_commit', self.bump)
+        event.listen(Session, 'after_rollback', self.forget)
+
+    def row_changed(self, mapper, connection, row):
+        object_session(row).info[self.key] = True
+
+    def bulk_changed(self, context, model):
+        if context.mapper.class_ is model:
+            context.session.info[self.key] = True
+
+    def bump(self, db_session):
+        if db_session.info.pop(self.key, False):
+            with self._lock:
+                self.value += 1
+
+    def forget(self, db_session):
+        db_session.info.pop(self.key, None)
+
+
+def collection_validators(version):
+    """
+    A tag for the collection at version (a CollectionVersion). The query
+    string is part of the tag since pages, filters and formats differ.
+
+    There is no Last-Modified: deleting a todo doesn't make the collection
+    newer, so If-Modified-Since would answer 304 with the deleted row still
+    in the client's copy. Collections are only validated by ETag.
+    """
+    tag = make_etag('todos', version.token, version.value, request.query_string.decode())
+    return tag, None
+
+
+def _utc(value):
+    if value is None or value.tzinfo is not None:
+        return value
+    return value.replace(tzinfo=timezone.utc)
+
+
+def not_modified(etag, last_modified):
+    """
+    True when the If-None-Match (or, without it, the If-Modified-Since)
+    header of a GET says the client already has this representation.
+    """
+    if request.if_none_match:
+        return request.if_none_match.contains_weak(etag)
+    since = request.if_modified_since
+    if since is not None and last_modified is not None:
+        return _utc(last_modified).replace(microsecond=0) <= _utc(since)
+    return False
+
+
+def precondition_failed(etag):
+    """
+    True when the request has an If-Match header that doesn't match etag, the
+    PUT or DELETE must then be answered with a 412.
+    """
+    if not request.if_match:
+        return False
+    return not request.if_match.contains(etag)
+
+
+def with_validators(response, etag, last_modified):
+    response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = _utc(last_modified)
+    return response
+
+
+def not_modified_response(etag, last_modified):
+    return with_validators(make_response('', 304), etag, last_modified)
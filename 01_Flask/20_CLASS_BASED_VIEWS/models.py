@@ -2,14 +2,30 @@
 from app import app
 
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import inspect, text
+from sqlite_engine import configure
+from conditional import CollectionVersion
 
+# WAL, pragmas and a connection pool for the threaded server
+configure(app)
 db = SQLAlchemy(app)
 class Todo(db.Model):
     id = db.Column("id", db.Integer(), primary_key=True, nullable=False)
     title = db.Column(db.String(80), unique=False, nullable=False)
     created_at = db.Column(db.DateTime, server_default=db.func.now())
-    updated_at = db.Column(db.DateTime, server_default=db.func.now(), server_onupdate=db.func.now())
+    updated_at = db.Column(db.DateTime, server_default=db.func.now(), onupdate=db.func.now(), server_onupdate=db.func.now())
     completed = db.Column(db.Boolean, default=False, nullable=False)
+    # bumped by SQLAlchemy on every update, the ETag of a todo is made from it
+    version = db.Column(db.Integer, nullable=False, server_default='1')
+
+    # indexes for the keyset pagination of GET /api/v1/todo, one per sort with
+    # and without the completed filter
+    __table_args__ = (
+        db.Index('ix_todo_created_at_id', 'created_at', 'id'),
+        db.Index('ix_todo_completed_id', 'completed', 'id'),
+        db.Index('ix_todo_completed_created_at_id', 'completed', 'created_at', 'id'),
+    )
+    __mapper_args__ = {'version_id_col': version}
 
     def __init__(self, title, completed):
         self.title = title
@@ -27,5 +43,20 @@ class Todo(db.Model):
             'updated_at': self.updated_at
         }
         
+# bumped after every commit that changes a todo, the ETag of the
+# collection is made from it
+todos_version = CollectionVersion(Todo)
+
 # creating tables
-db.create_all()
\ No newline at end of file
+db.create_all()
+
+# databases created before the version column existed
+if 'version' not in [column['name'] for column in inspect(db.engine).get_columns('todo')]:
+    with db.engine.begin() as connection:
+        connection.execute(text("ALTER TABLE todo ADD COLUMN version INTEGER NOT NULL DEFAULT 1"))
+
+# databases created before the indexes existed
+existing_indexes = {index['name'] for index in inspect(db.engine).get_indexes('todo')}
+for index in Todo.__table__.indexes:
+    if index.name not in existing_indexes:
+        index.create(db.engine)
\ No newline at end of file
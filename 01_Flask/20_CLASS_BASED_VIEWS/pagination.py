@@ -0,0 +1,114 @@
+"""
+Keyset (cursor) pagination of the todos. Instead of OFFSET, which makes the
+database walk past every skipped row, a page starts right after the sort key
+of the last row of the previous page, so every page costs the same however
+deep it is. The cursor handed to the client is that key, base64 encoded.
+"""
+import base64
+import json
+
+from sqlalchemy import String, and_, or_, type_coerce
+
+# sort name -> (column to sort by before the id, descending)
+SORTS = {
+    'id': (None, False),
+    '-id': (None, True),
+    'created_at': ('created_at', False),
+    '-created_at': ('created_at', True),
+}
+
+TRUE_VALUES = ('1', 'true', 'yes')
+FALSE_VALUES = ('0', 'false', 'no')
+
+
+class InvalidParameter(ValueError):
+    pass
+
+
+def parse_bool(name, value):
+    if value is None:
+        return None
+    if value.lower() in TRUE_VALUES:
+        return True
+    if value.lower() in FALSE_VALUES:
+        return False
+    raise InvalidParameter(f'"{name}" must be true or false.')
+
+
+def parse_limit(value, default, maximum):
+    if value is None:
+        return default
+    try:
+        limit = int(value)
+    except ValueError:
+        raise InvalidParameter('"limit" must be a number.')
+    if limit < 1:
+        raise InvalidParameter('"limit" must be at least 1.')
+    return min(limit, maximum)
+
+
+def encode_cursor(sort, key, id):
+    data = json.dumps([sort, key, id], separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(data).decode().rstrip('=')
+
+
+def decode_cursor(cursor, sort):
+    try:
+        data = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        cursor_sort, key, id = json.loads(data)
+    except (ValueError, TypeError):
+        raise InvalidParameter('Invalid "cursor".')
+    if cursor_sort != sort:
+        raise InvalidParameter('The "cursor" was made for another sort order.')
+    return key, id
+
+
+def sorted_query(query, model, sort):
+    """
+    Returns the query ordered by sort and the sort column, if any. The column
+    is compared as the string the database stores (SQLite keeps datetimes as
+    text) so the key in the cursor matches rows with the same timestamp.
+    """
+    if sort not in SORTS:
+        raise InvalidParameter(f'"sort" must be one of {", ".join(SORTS)}.')
+    name, descending = SORTS[sort]
+    column = None
+    order = []
+    if name is not None:
+        column = type_coerce(getattr(model, name), String)
+        order.append(column.desc() if descending else column.asc())
+    order.append(model.id.desc() if descending else model.id.asc())
+    return query.order_by(*order), column
+
+
+def paginate(query, model, sort, cursor, limit):
+    """
+    Returns a page of at most limit rows of query and the cursor of the next
+    page (None on the last page).
+    """
+    query, column = sorted_query(query, model, sort)
+    descending = SORTS[sort][1]
+    if column is not None:
+        query = query.add_columns(column)
+    if cursor:
+        key, last_id = decode_cursor(cursor, sort)
+        after_id = model.id < last_id if descending else model.id > last_id
+        if column is None:
+            query = query.filter(after_id)
+        else:
+            after_key = column < key if descending else column > key
+            query = query.filter(or_(after_key, and_(column == key, after_id)))
+    rows = query.limit(limit + 1).all()
+    more = len(rows) > limit
+    rows = rows[:limit]
+    if column is None:
+        items, keys = rows, [None] * len(rows)
+    else:
+        items, keys = [row[0] for row in rows], [row[1] for row in rows]
+    next_cursor = None
+    if more and items:
+        key = keys[-1]
+        if key is not None and not isinstance(key, str):
+            key = str(key)
+        next_cursor = encode_cursor(sort, key, items[-1].id)
+    return items, next_cursor
@@ -0,0 +1,45 @@
+"""
+Streams every row of a query as json without building the whole list first.
+The query is read yield_per rows at a time and every batch is serialized and
+sent before the next one is loaded, so memory stays the same whatever the
+size of the table.
+"""
+from flask import json
+
+
+def dumps(obj):
+    return json.dumps(obj, separators=(',', ':'))
+
+
+def iter_batches(query, batch_size):
+    batch = []
+    for row in query.yield_per(batch_size):
+        batch.append(row)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def ndjson(query, serialize, batch_size=500):
+    """
+    One json document per line.
+    """
+    for batch in iter_batches(query, batch_size):
+        yield ''.join(dumps(serialize(row)) + '\n' for row in batch)
+
+
+def json_document(envelope, key, query, serialize, batch_size=500):
+    """
+    The envelope dict with the rows as a json array under key, the same
+    document jsonify({**envelope, key: [...]}) would produce.
+    """
+    head = dumps(envelope)
+    yield head[:-1] + (',' if envelope else '') + dumps(key) + ':['
+    first = True
+    for batch in iter_batches(query, batch_size):
+        chunk = ','.join(dumps(serialize(row)) for row in batch)
+        yield chunk if first else ',' + chunk
+        first = False
+    yield ']}'
@@ -1,6 +1,7 @@
 from flask import Flask, abort
 from flask_restful import Api, Resource, reqparse, marshal_with, fields
 from flask_sqlalchemy import SQLAlchemy
+from sqlite_engine import configure
 
 app = Flask(__name__)
 app.config["ENV"] = "development"
@@ -33,6 +34,8 @@ resource_fields = {
 	'likes': fields.Integer
 }
 
+# WAL, pragmas and a connection pool for the threaded server
+configure(app)
 db = SQLAlchemy(app)
 
 class User(db.Model):
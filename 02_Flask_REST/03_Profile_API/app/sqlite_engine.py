@@ -0,0 +1,98 @@
+"""
+SQLite settings for an app served by several threads at once. Call
+configure(app) before SQLAlchemy(app):
+
+    from sqlite_engine import configure
+    configure(app)
+    db = SQLAlchemy(app)
+
+Every new SQLite connection of the app's engine gets the pragmas below and
+the engine keeps a pool of open connections shared by the request threads,
+so the page cache and the pragmas survive between requests.
+"""
+import sqlite3
+
+from sqlalchemy.pool import QueuePool
+
+PRAGMAS = {
+    # readers no longer wait for a writer and a writer doesn't wait for readers
+    'journal_mode': 'WAL',
+    # with WAL a crash can't corrupt the database, at worst it loses the last
+    # commits, and commits no longer wait for the disk
+    'synchronous': 'NORMAL',
+    # wait up to 5s for another writer instead of failing with "database is locked"
+    'busy_timeout': 5000,
+    # 64MB page cache per connection (negative values are KiB)
+    'cache_size': -64000,
+    # read the first 256MB of the file through a memory map
+    'mmap_size': 256 * 1024 * 1024,
+    'temp_store': 'MEMORY',
+}
+
+
+def set_pragmas(dbapi_connection, pragmas):
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name}={value}')
+    finally:
+        cursor.close()
+
+
+def pragmas_listener(pragmas):
+    """
+    A "connect" event listener setting pragmas on every SQLite connection.
+    """
+    def on_connect(dbapi_connection, connection_record):
+        if isinstance(dbapi_connection, sqlite3.Connection):
+            set_pragmas(dbapi_connection, pragmas)
+    return on_connect
+
+
+def connection_factory(pragmas):
+    """
+    A sqlite3.Connection class setting pragmas when it is opened. Given to
+    sqlite3.connect() as the factory connect argument, so only the engine
+    created with it gets the pragmas.
+    """
+    class PragmaConnection(sqlite3.Connection):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            set_pragmas(self, pragmas)
+    return PragmaConnection
+
+
+def engine_options(busy_timeout=PRAGMAS['busy_timeout'], pool_size=5, max_overflow=10):
+    """
+    create_engine() options: a pool of connections that can be handed from
+    one thread to another (a file database otherwise gets a new connection
+    per checkout on older SQLAlchemy versions).
+    """
+    return {
+        'poolclass': QueuePool,
+        'pool_size': pool_size,
+        'max_overflow': max_overflow,
+        'connect_args': {
+            'check_same_thread': False,
+            'timeout': busy_timeout / 1000,
+        },
+    }
+
+
+def configure(app, pool_size=5, max_overflow=10, **pragmas):
+    """
+    Sets SQLALCHEMY_ENGINE_OPTIONS of app and the pragmas of every SQLite
+    connection. Pragmas passed as keyword arguments or in the SQLITE_PRAGMAS
+    config override the defaults. In memory databases are left alone since
+    every pooled connection would get its own empty database.
+    """
+    uri = app.config.get('SQLALCHEMY_DATABASE_URI', '')
+    if not uri.startswith('sqlite') or uri in ('sqlite://', 'sqlite:///:memory:'):
+        return
+    pragmas = {**PRAGMAS, **app.config.get('SQLITE_PRAGMAS', {}), **pragmas}
+    options = engine_options(pragmas['busy_timeout'], pool_size, max_overflow)
+    options.update(app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {}))
+    # set through the options instead of an event listener on the Engine
+    # class, which would apply them to every engine of the process
+    options['connect_args'] = {**options.get('connect_args', {}), 'factory': connection_factory(pragmas)}
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = options
@@ -0,0 +1,67 @@
+"""
+Compares the latency of the old trial division loop against the factorization
+engine in the primes package across input magnitudes.
+
+    python benchmark.py
+    python benchmark.py --repeat 5 --skip-naive-above 10000000
+"""
+import argparse
+import json
+from random import randrange, seed
+from time import perf_counter
+
+from primes import isPrime
+
+
+def isPrimeNaive(number: int):
+  factors = list()
+  if (number < 1) :return False
+  if (number == 1) :return True
+
+  for i in range(2, number):
+      if number % i == 0:
+          factors.append(i)
+  return {
+    "number": number,
+    "factors": factors,
+    "prime": False if len(factors) > 0 else True,
+  };
+
+
+def timeit(fn, numbers, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = perf_counter()
+        for n in numbers:
+            fn(n)
+        best = min(best, perf_counter() - start)
+    return best / len(numbers) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--samples", type=int, default=5, help="numbers tested per magnitude")
+    parser.add_argument("--repeat", type=int, default=3, help="best of N runs")
+    parser.add_argument("--max-digits", type=int, default=18)
+    parser.add_argument("--skip-naive-above", type=int, default=10 ** 7,
+                        help="the old loop is O(n), don't wait for it on huge numbers")
+    args = parser.parse_args()
+
+    seed(0)
+    for digits in range(2, args.max_digits + 1):
+        low, high = 10 ** (digits - 1), 10 ** digits
+        numbers = [randrange(low, high) for _ in range(args.samples)]
+        row = {"digits": digits, "engine_ms": round(timeit(isPrime, numbers, args.repeat), 4)}
+        if high <= args.skip_naive_above:
+            for n in numbers:
+                assert isPrime(n) == isPrimeNaive(n), n
+            row["naive_ms"] = round(timeit(isPrimeNaive, numbers, args.repeat), 4)
+            row["speedup"] = round(row["naive_ms"] / max(row["engine_ms"], 1e-9), 1)
+        else:
+            row["naive_ms"] = None
+            row["speedup"] = None
+        print(json.dumps(row))
+
+
+if __name__ == "__main__":
+    main()
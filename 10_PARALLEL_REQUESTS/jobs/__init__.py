@@ -0,0 +1,180 @@
+import multiprocessing
+import queue
+import threading
+from datetime import datetime
+from time import monotonic
+from uuid import uuid4
+
+from workers import QueueFull
+
+
+class Job:
+    def __init__(self, number):
+        self.id = uuid4().hex
+        self.number = number
+        self.status = "pending"
+        self.result = None
+        self.error = None
+        self.created_at = datetime.now()
+        self.finished_at = None
+        self.expires = None
+        self._done = threading.Event()
+        self._process = None
+
+    @property
+    def finished(self) -> bool:
+        return self._done.is_set()
+
+    def to_json(self):
+        return {
+            "id": self.id,
+            "number": self.number,
+            "status": self.status,
+            "result": self.result,
+            "error": self.error,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+        }
+
+
+def _work(fn, args, conn, initializer, initargs):
+    try:
+        if initializer is not None:
+            initializer(*initargs)
+        conn.send((True, fn(*args)))
+    except Exception as e:
+        conn.send((False, f"{type(e).__name__}: {e}"))
+    finally:
+        conn.close()
+
+
+class JobManager:
+    """
+    Runs fn(number) in the background for requests that would take longer
+    than an http timeout.
+
+    Every running job gets its own process, at most `workers` at a time, so
+    cancelling a running job can terminate the process and free the worker
+    straight away. Finished jobs are kept for `ttl` seconds and submitting a
+    number that is already running or finished returns the same job.
+    """
+
+    def __init__(self, fn, workers=None, ttl=600, max_pending=1000, retry_after=1,
+                 initializer=None, initargs=()):
+        self.fn = fn
+        self.workers = workers or multiprocessing.cpu_count()
+        self.ttl = ttl
+        self.max_pending = max_pending
+        self.retry_after = retry_after
+        self._initializer = initializer
+        self._initargs = initargs
+        self._context = multiprocessing.get_context()
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._jobs = {}
+        self._by_number = {}
+        self._threads = []
+        self._running = 0
+
+    def _start(self):
+        if not self._threads:
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._dispatch, name=f"job-worker-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def _prune(self):
+        now = monotonic()
+        for job in [job for job in self._jobs.values() if job.expires and job.expires < now]:
+            del self._jobs[job.id]
+            if self._by_number.get(job.number) is job:
+                del self._by_number[job.number]
+
+    def _finish(self, job, status, result=None, error=None):
+        job.status, job.result, job.error = status, result, error
+        job.finished_at = datetime.now()
+        job.expires = monotonic() + self.ttl
+        job._process = None
+        if status != "done" and self._by_number.get(job.number) is job:
+            del self._by_number[job.number]
+        job._done.set()
+
+    def _dispatch(self):
+        while True:
+            job = self._queue.get()
+            with self._lock:
+                if job.status != "pending":
+                    continue
+                receiver, sender = self._context.Pipe(duplex=False)
+                process = self._context.Process(
+                    target=_work, args=(self.fn, (job.number,), sender, self._initializer, self._initargs),
+                    daemon=True)
+                job.status = "running"
+                job._process = process
+                self._running += 1
+                process.start()
+            sender.close()
+            try:
+                ok, value = receiver.recv()
+            except EOFError:
+                ok, value = False, "The worker exited without a result."
+            receiver.close()
+            process.join()
+            with self._lock:
+                self._running -= 1
+                if job.status != "running":
+                    continue
+                if ok:
+                    self._finish(job, "done", result=value)
+                else:
+                    self._finish(job, "failed", error=value)
+
+    def submit(self, number) -> Job:
+        with self._lock:
+            self._prune()
+            job = self._by_number.get(number)
+            if job is not None:
+                return job
+            if self._queue.qsize() >= self.max_pending:
+                raise QueueFull(self.retry_after)
+            job = Job(number)
+            self._jobs[job.id] = job
+            self._by_number[number] = job
+            self._start()
+        self._queue.put(job)
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            self._prune()
+            return self._jobs.get(job_id)
+
+    def wait(self, job_id, timeout=None):
+        """
+        Long polling: waits up to timeout seconds for the job to finish.
+        """
+        job = self.get(job_id)
+        if job is not None:
+            job._done.wait(timeout)
+        return job
+
+    def cancel(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.finished:
+                return job
+            process = job._process
+            self._finish(job, "cancelled")
+        if process is not None:
+            process.terminate()
+        return job
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "running": self._running,
+                "pending": self._queue.qsize(),
+                "jobs": len(self._jobs),
+                "ttl": self.ttl,
+            }
@@ -0,0 +1,258 @@
+"""
+Load generator for the /isprime/<id> route. It starts the app locally in each
+server mode, fires a mix of small and large numbers at it with N concurrent
+clients and prints throughput, latency percentiles and error rates as json.
+
+    python loadtest.py
+    python loadtest.py --modes dev,threaded,processes --concurrency 32 --requests 2000
+    python loadtest.py --client asyncio --large-ratio 0.3 --executor inline
+
+Server modes:
+    dev        the werkzeug server handling one request at a time
+    threaded   the werkzeug server with a thread per request (app.run default)
+    processes  --server-processes pre-forked processes sharing the listening
+               socket, each threaded and with its own long-lived pool, like
+               gunicorn -w N
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import signal
+import socket
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+MODES = ("dev", "threaded", "processes")
+
+
+def serve(args):
+    if args.mode == "processes":
+        return serve_prefork(args)
+    from werkzeug.serving import run_simple
+    from main import app
+
+    options = {
+        "dev": {"threaded": False},
+        "threaded": {"threaded": True},
+    }[args.mode]
+    run_simple("127.0.0.1", args.port, app, use_reloader=False, use_debugger=False, **options)
+
+
+def serve_prefork(args):
+    """
+    Binds the socket once and forks the workers that accept on it. run_simple
+    with processes=N forks a child per request instead, so every request
+    imported a fresh Executor and started its own pool.
+    """
+    from werkzeug.serving import make_server
+
+    listener = socket.socket()
+    listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listener.bind(("127.0.0.1", args.port))
+    listener.listen(128)
+    children = []
+    for _ in range(args.server_processes):
+        pid = os.fork()
+        if pid == 0:
+            # imported after the fork, every worker keeps its own pool
+            from main import app
+            make_server("127.0.0.1", args.port, app, threaded=True, fd=listener.fileno()).serve_forever()
+            os._exit(0)
+        children.append(pid)
+
+    def stop(signum, frame):
+        for pid in children:
+            os.kill(pid, signal.SIGTERM)
+    signal.signal(signal.SIGTERM, stop)
+    for pid in children:
+        os.waitpid(pid, 0)
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(mode, args):
+    port = free_port()
+    env = dict(os.environ, CPU_EXECUTOR=args.executor)
+    process = subprocess.Popen(
+        [sys.executable, __file__, "serve", "--mode", mode, "--port", str(port),
+         "--server-processes", str(args.server_processes)],
+        cwd=os.path.dirname(os.path.abspath(__file__)), env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        # its own process group, the pool processes are stopped with it
+        start_new_session=True)
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            urllib.request.urlopen(f"http://127.0.0.1:{port}/stats", timeout=1).read()
+            return process, port
+        except (urllib.error.URLError, ConnectionError, OSError):
+            if process.poll() is not None:
+                break
+            time.sleep(0.1)
+    stop_server(process)
+    raise RuntimeError(f"The {mode} server did not start.")
+
+
+def stop_server(process):
+    try:
+        os.killpg(process.pid, signal.SIGTERM)
+    except ProcessLookupError:
+        pass
+    process.wait()
+
+
+def workload(args):
+    rng = random.Random(args.seed)
+    small, large = args.small, args.large
+    for _ in range(args.requests):
+        if rng.random() < args.large_ratio:
+            yield "large", rng.randint(*large)
+        else:
+            yield "small", rng.randint(*small)
+
+
+def fetch(port, number, timeout):
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/isprime/{number}", timeout=timeout) as res:
+            res.read()
+            status = res.status
+    except urllib.error.HTTPError as e:
+        status = e.code
+    except Exception as e:
+        status = type(e).__name__
+    return status, time.perf_counter() - start
+
+
+def run_threads(port, jobs, args):
+    with ThreadPoolExecutor(args.concurrency) as pool:
+        futures = [(kind, pool.submit(fetch, port, number, args.timeout)) for kind, number in jobs]
+        return [(kind, *future.result()) for kind, future in futures]
+
+
+async def fetch_async(port, number, timeout):
+    start = time.perf_counter()
+    try:
+        reader, writer = await asyncio.wait_for(asyncio.open_connection("127.0.0.1", port), timeout)
+        writer.write(f"GET /isprime/{number} HTTP/1.1\r\nHost: 127.0.0.1\r\nConnection: close\r\n\r\n".encode())
+        await writer.drain()
+        response = await asyncio.wait_for(reader.read(), timeout)
+        writer.close()
+        status = int(response.split(b" ", 2)[1])
+    except Exception as e:
+        status = type(e).__name__
+    return status, time.perf_counter() - start
+
+
+async def run_asyncio(port, jobs, args):
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def one(kind, number):
+        async with semaphore:
+            return (kind, *await fetch_async(port, number, args.timeout))
+    return await asyncio.gather(*(one(kind, number) for kind, number in jobs))
+
+
+def percentile(values, p):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+def summarize(results):
+    latencies = [latency * 1000 for _, status, latency in results if status == 200]
+    errors = {}
+    for _, status, _ in results:
+        if status != 200:
+            errors[str(status)] = errors.get(str(status), 0) + 1
+    return {
+        "requests": len(results),
+        "error_rate": round(sum(errors.values()) / max(len(results), 1), 4),
+        "errors": errors,
+        "latency_ms": {
+            "mean": round(sum(latencies) / len(latencies), 3) if latencies else None,
+            "p50": percentile(latencies, 50) and round(percentile(latencies, 50), 3),
+            "p95": percentile(latencies, 95) and round(percentile(latencies, 95), 3),
+            "p99": percentile(latencies, 99) and round(percentile(latencies, 99), 3),
+            "max": round(max(latencies), 3) if latencies else None,
+        },
+    }
+
+
+def benchmark(mode, args):
+    process, port = start_server(mode, args)
+    try:
+        jobs = list(workload(args))
+        start = time.perf_counter()
+        if args.client == "asyncio":
+            results = asyncio.run(run_asyncio(port, jobs, args))
+        else:
+            results = run_threads(port, jobs, args)
+        duration = time.perf_counter() - start
+    finally:
+        stop_server(process)
+
+    report = {
+        "mode": mode,
+        "client": args.client,
+        "executor": args.executor,
+        "concurrency": args.concurrency,
+        "duration_s": round(duration, 3),
+        "throughput_rps": round(len(results) / duration, 2),
+        # a 503 is answered straight away, only the 200s are work done
+        "ok_throughput_rps": round(sum(1 for r in results if r[1] == 200) / duration, 2),
+    }
+    report.update(summarize(results))
+    report["by_kind"] = {
+        kind: summarize([r for r in results if r[0] == kind])
+        for kind in ("small", "large")
+    }
+    return report
+
+
+def number_range(value):
+    low, high = value.split("-")
+    return int(float(low)), int(float(high))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command")
+    serve_parser = commands.add_parser("serve", help="run the app in one server mode (used internally)")
+    serve_parser.add_argument("--mode", choices=MODES, required=True)
+    serve_parser.add_argument("--port", type=int, required=True)
+    serve_parser.add_argument("--server-processes", type=int, default=os.cpu_count())
+
+    parser.add_argument("--modes", default=",".join(MODES), help="comma separated server modes to compare")
+    parser.add_argument("--client", choices=("threads", "asyncio"), default="threads")
+    parser.add_argument("--executor", choices=("process", "thread", "inline"), default="process",
+                        help="CPU_EXECUTOR for the app")
+    parser.add_argument("--server-processes", type=int, default=os.cpu_count())
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--large-ratio", type=float, default=0.1)
+    parser.add_argument("--small", type=number_range, default=(2, 10 ** 5), help="e.g. 2-1e5")
+    parser.add_argument("--large", type=number_range, default=(10 ** 15, 10 ** 18), help="e.g. 1e15-1e18")
+    parser.add_argument("--timeout", type=float, default=30)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        return serve(args)
+    reports = [benchmark(mode, args) for mode in args.modes.split(",")]
+    print(json.dumps(reports, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,29 +1,196 @@
-
-from flask import Flask, request,  make_response, jsonify
+import json
+import os
+from flask import Flask, Response, request,  make_response, jsonify
+from primes import factor_lists, isPrime, use_table
+from primes.sieve import ndjson_segment, prime_flags, range_flags
+from primes.spf import build
+from jobs import JobManager
+from workers import Executor, QueueFull
 
 
 app = Flask(__name__)
 
+"""
+Smallest prime factor table shared by every worker through mmap. If the file
+does not exist and SPF_TABLE_BOUND is set, the table is built on startup,
+otherwise isPrime just uses the computational path.
+"""
+app.config["SPF_TABLE_PATH"] = os.environ.get("SPF_TABLE_PATH", "spf.bin")
+app.config["SPF_TABLE_BOUND"] = int(os.environ.get("SPF_TABLE_BOUND", 0))
+app.config["BATCH_MAX_SIZE"] = int(os.environ.get("BATCH_MAX_SIZE", 10 ** 6))
+app.config["RANGE_MAX_SIZE"] = int(os.environ.get("RANGE_MAX_SIZE", 10 ** 10))
+
+if not os.path.exists(app.config["SPF_TABLE_PATH"]) and app.config["SPF_TABLE_BOUND"]:
+    build(app.config["SPF_TABLE_BOUND"], app.config["SPF_TABLE_PATH"])
+if os.path.exists(app.config["SPF_TABLE_PATH"]):
+    use_table(app.config["SPF_TABLE_PATH"])
+
+"""
+CPU heavy work runs in a pool of processes sized to the cores so it is not
+serialized by the GIL and doesn't stall the other routes. When every worker is
+busy and the queue is full we answer 503 with a Retry-After header.
+"""
+app.config["CPU_EXECUTOR"] = os.environ.get("CPU_EXECUTOR", "process")
+app.config["CPU_WORKERS"] = int(os.environ.get("CPU_WORKERS", 0)) or os.cpu_count()
+app.config["CPU_QUEUE_SIZE"] = int(os.environ.get("CPU_QUEUE_SIZE", 2 * app.config["CPU_WORKERS"]))
+app.config["CPU_RETRY_AFTER"] = int(os.environ.get("CPU_RETRY_AFTER", 1))
+
+cpu = Executor(
+    app.config["CPU_EXECUTOR"],
+    workers=app.config["CPU_WORKERS"],
+    queue_size=app.config["CPU_QUEUE_SIZE"],
+    retry_after=app.config["CPU_RETRY_AFTER"],
+    initializer=use_table if os.path.exists(app.config["SPF_TABLE_PATH"]) else None,
+    initargs=(app.config["SPF_TABLE_PATH"],),
+)
+
+"""
+Background jobs for numbers whose factorization takes longer than an http
+timeout. Finished results are kept for JOBS_TTL seconds.
+"""
+app.config["JOBS_WORKERS"] = int(os.environ.get("JOBS_WORKERS", 0)) or os.cpu_count()
+app.config["JOBS_TTL"] = int(os.environ.get("JOBS_TTL", 600))
+app.config["JOBS_MAX_PENDING"] = int(os.environ.get("JOBS_MAX_PENDING", 1000))
+app.config["JOBS_MAX_WAIT"] = int(os.environ.get("JOBS_MAX_WAIT", 30))
+
+jobs = JobManager(
+    isPrime,
+    workers=app.config["JOBS_WORKERS"],
+    ttl=app.config["JOBS_TTL"],
+    max_pending=app.config["JOBS_MAX_PENDING"],
+    retry_after=app.config["CPU_RETRY_AFTER"],
+    initializer=use_table if os.path.exists(app.config["SPF_TABLE_PATH"]) else None,
+    initargs=(app.config["SPF_TABLE_PATH"],),
+)
 
-def isPrime(number:int):
-  factors = list()
-  if (number < 1) :return False
-  if (number == 1) :return True
 
-  for i in range(2, number):
-      if number % i == 0:
-          factors.append(i)
-  return {
-    "number": number,
-    "factors": factors,
-    "prime": False if len(factors) > 0 else True,
-  };
+@app.errorhandler(QueueFull)
+def busy(e):
+    res = make_response(jsonify({"message": str(e)}), 503)
+    res.headers["Retry-After"] = str(e.retry_after)
+    return res
+
+
+def is_interval(start, end):
+    """
+    The rule for [start, end] in /isprime/batch and /isprime/range: both ends
+    are integers and start <= end, an empty interval is rejected.
+    """
+    return type(start) is int and type(end) is int and start <= end
+
+
+@app.route('/stats', methods=["GET"])
+def stats():
+    return make_response(jsonify(cpu.stats())), 200
 
 
 @app.route('/isprime/<int:id>', methods=["GET"])
 def _(id):
-    return make_response(jsonify(isPrime(id))), 200
+    return make_response(jsonify(cpu.run(isPrime, id))), 200
+
+
+@app.route('/isprime/batch', methods=["POST"])
+def batch():
+    """
+    Checks many numbers in one request. The body is either a json array of
+    numbers or {"start": a, "end": b} for every number in [a, b]. The response
+    is columnar json, or one json object per line with ?format=ndjson. Factors
+    are only computed (one by one, with isPrime) when ?factors=true.
+    """
+    data = request.get_json(silent=True)
+    if isinstance(data, dict) and is_interval(data.get("start"), data.get("end")):
+        start, end = data["start"], data["end"]
+        size = end - start + 1
+        numbers = range(start, end + 1)
+    elif isinstance(data, list) and all(type(n) is int for n in data):
+        size = len(data)
+        numbers = data
+    else:
+        return make_response(jsonify({
+            "message": 'Send a json array of integers or {"start": int, "end": int} with start <= end.',
+        })), 400
+    if not 0 <= size <= app.config["BATCH_MAX_SIZE"]:
+        return make_response(jsonify({
+            "message": f"A batch can have at most {app.config['BATCH_MAX_SIZE']} numbers.",
+        })), 413
+
+    if isinstance(numbers, range):
+        flags = cpu.run(range_flags, start, end)
+    else:
+        flags = cpu.run(prime_flags, numbers)
+    factors = cpu.run(factor_lists, numbers) if request.args.get("factors") == "true" else None
+    numbers, flags = list(numbers), flags.tolist()
+
+    if request.args.get("format") == "ndjson":
+        def lines():
+            for i, number in enumerate(numbers):
+                line = {"number": number, "prime": flags[i]}
+                if factors is not None:
+                    line["factors"] = factors[i]
+                yield json.dumps(line) + "\n"
+        return Response(lines(), mimetype="application/x-ndjson")
+
+    columns = {"number": numbers, "prime": flags}
+    if factors is not None:
+        columns["factors"] = factors
+    return make_response(jsonify(columns)), 200
+
+
+@app.route('/isprime/range', methods=["GET"])
+def prime_range():
+    """
+    Streams every prime in [start, end] as NDJSON, or every number with its
+    factors when ?factors=true. The interval is split into segments that are
+    sieved in parallel by the cpu pool and sent in order as they finish, only
+    a few segments are held in memory at any time.
+    """
+    start = request.args.get("start", type=int)
+    end = request.args.get("end", type=int)
+    factors = request.args.get("factors") == "true"
+    if not is_interval(start, end):
+        return make_response(jsonify({"message": "Send ?start=int&end=int with start <= end."})), 400
+    if end - start + 1 > app.config["RANGE_MAX_SIZE"]:
+        return make_response(jsonify({
+            "message": f"A range can have at most {app.config['RANGE_MAX_SIZE']} numbers.",
+        })), 413
+
+    size = 4096 if factors else 1 << 20
+    segments = ((low, min(low + size, end + 1), factors) for low in range(start, end + 1, size))
+    return Response(cpu.imap(ndjson_segment, segments), mimetype="application/x-ndjson")
+
+
+@app.route('/jobs', methods=["POST"])
+def submit_job():
+    data = request.get_json(silent=True)
+    number = data.get("number") if isinstance(data, dict) else None
+    if type(number) is not int:
+        return make_response(jsonify({"message": 'Send {"number": int}.'})), 400
+    job = jobs.submit(number)
+    res = make_response(jsonify({"job": job.to_json()}), 200 if job.finished else 202)
+    res.headers["Location"] = f"/jobs/{job.id}"
+    return res
+
+
+@app.route('/jobs', methods=["GET"])
+def jobs_stats():
+    return make_response(jsonify(jobs.stats())), 200
+
+
+@app.route('/jobs/<string:job_id>', methods=["GET", "DELETE"])
+def job_status(job_id):
+    """
+    GET /jobs/<id>?wait=10 long polls for up to 10 seconds (at most
+    JOBS_MAX_WAIT) before answering, DELETE cancels the job.
+    """
+    if request.method == "DELETE":
+        job = jobs.cancel(job_id)
+    else:
+        wait = min(request.args.get("wait", 0, type=float), app.config["JOBS_MAX_WAIT"])
+        job = jobs.wait(job_id, wait) if wait > 0 else jobs.get(job_id)
+    if job is None:
+        return make_response(jsonify({"message": f"Job '{job_id}' was not found."})), 404
+    return make_response(jsonify({"job": job.to_json()})), 200
     
     
 if __name__ == "__main__":
-    app.run(debug=True, port=3001) # allow hot reloading
\ No newline at end of file
+    app.run(debug=True, port=3001) # allow hot reloading
@@ -0,0 +1,155 @@
+from math import gcd, isqrt
+from random import randrange
+
+"""
+Small primes used for trial division before we do anything clever. Stripping
+them first means Miller-Rabin and Pollard-rho only ever see numbers without
+tiny factors.
+"""
+SMALL_PRIMES = [p for p in range(2, 1000) if all(p % d for d in range(2, isqrt(p) + 1))]
+
+"""
+With these bases Miller-Rabin is deterministic for every n < 3.3 * 10^24,
+which covers anything a route like /isprime/<int:id> will realistically get.
+Above that the answer is a strong probable prime.
+"""
+MILLER_RABIN_BASES = (2, 3, 5, 7, 11, 13, 17, 19, 23, 29, 31, 37, 41)
+
+"""
+Optional smallest prime factor table (see primes/spf.py). Numbers up to its
+bound are factored with table lookups, everything above falls back to the
+computational path.
+"""
+_table = None
+
+
+def use_table(path):
+    """
+    Attaches the spf table at path, or detaches it when path is None. The file
+    is only opened on the first lookup.
+    """
+    global _table
+    from primes.spf import SpfTable
+    if _table is not None:
+        _table.close()
+    _table = SpfTable(path) if path else None
+
+
+def is_prime(n: int) -> bool:
+    if n < 2:
+        return False
+    for p in SMALL_PRIMES:
+        if n % p == 0:
+            return n == p
+    if n < SMALL_PRIMES[-1] ** 2:
+        return True
+
+    d, s = n - 1, 0
+    while d % 2 == 0:
+        d //= 2
+        s += 1
+    for a in MILLER_RABIN_BASES:
+        x = pow(a, d, n)
+        if x == 1 or x == n - 1:
+            continue
+        for _ in range(s - 1):
+            x = x * x % n
+            if x == n - 1:
+                break
+        else:
+            return False
+    return True
+
+
+def _pollard_rho(n: int) -> int:
+    """
+    Brent's variant of Pollard-rho. Returns a non trivial divisor of the odd
+    composite n.
+    """
+    while True:
+        y, c, m = randrange(1, n), randrange(1, n), 128
+        g, r, q = 1, 1, 1
+        while g == 1:
+            x = y
+            for _ in range(r):
+                y = (y * y + c) % n
+            k = 0
+            while k < r and g == 1:
+                ys = y
+                for _ in range(min(m, r - k)):
+                    y = (y * y + c) % n
+                    q = q * abs(x - y) % n
+                g = gcd(q, n)
+                k += m
+            r *= 2
+        if g == n:
+            g = 1
+            while g == 1:
+                ys = (ys * ys + c) % n
+                g = gcd(abs(x - ys), n)
+        if g != n:
+            return g
+
+
+def prime_factors(n: int) -> dict:
+    """
+    Returns the prime factorization of n as {prime: exponent}.
+    """
+    factors = {}
+    for p in SMALL_PRIMES:
+        if p * p > n:
+            break
+        while n % p == 0:
+            factors[p] = factors.get(p, 0) + 1
+            n //= p
+    stack = [n] if n > 1 else []
+    while stack:
+        m = stack.pop()
+        if is_prime(m):
+            factors[m] = factors.get(m, 0) + 1
+            continue
+        root = isqrt(m)
+        if root * root == m:
+            stack += [root, root]
+            continue
+        d = _pollard_rho(m)
+        stack += [d, m // d]
+    return dict(sorted(factors.items()))
+
+
+def divisors(factorization: dict) -> list:
+    """
+    Expands {prime: exponent} into the sorted list of every divisor.
+    """
+    result = [1]
+    for p, e in factorization.items():
+        result = [d * p ** k for d in result for k in range(e + 1)]
+    return sorted(result)
+
+
+def isPrime(number: int):
+    if (number < 1): return False
+    if (number == 1): return True
+
+    """
+    The factors are every divisor between 1 and the number itself (exclusive),
+    exactly like the old loop over range(2, number), but built from the
+    prime factorization instead of trying every integer.
+    """
+    if _table is not None and number <= _table.bound:
+        factorization = _table.prime_factors(number)
+    else:
+        factorization = prime_factors(number)
+    factors = divisors(factorization)[1:-1]
+    return {
+        "number": number,
+        "factors": factors,
+        "prime": False if len(factors) > 0 else True,
+    }
+
+
+def factor_lists(numbers) -> list:
+    """
+    The isPrime factors of every number, [] where isPrime has no factors.
+    """
+    return [result["factors"] if isinstance(result, dict) else [] for result in map(isPrime, numbers)]
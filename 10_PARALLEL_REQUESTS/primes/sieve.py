@@ -0,0 +1,204 @@
+"""
+Vectorized primality for many numbers at once using a NumPy segmented sieve.
+
+The "prime" flag follows isPrime: numbers below 1 are False, 1 is True (isPrime
+returns True for it) and everything else is True only when it has no divisor
+between 1 and itself.
+"""
+import json
+from math import isqrt, log
+
+import numpy as np
+
+from primes import factor_lists, is_prime
+
+"""
+Width of one sieve segment. Numbers above 2^32 are grouped into segments of this
+width and a segment is only sieved when enough numbers fall into it, sparse
+numbers are tested one by one with Miller-Rabin instead.
+"""
+SEGMENT_SIZE = 1 << 20
+
+"""
+Sieving a segment takes one Python step (about 1.2us) per base prime up to
+sqrt(high), near 10^14 that is 664,579 steps, whatever the number of values in
+the segment. Miller-Rabin costs about 4 of these steps per number with is_prime
+and half of one per number with the vectorized version below 2^32, so a segment
+is only sieved when it holds enough numbers to pay for its base primes.
+"""
+MILLER_RABIN_COST = 4
+UINT32_MILLER_RABIN_COST = 0.5
+
+"""
+Sieving needs every prime up to sqrt(high), past this the base primes get too
+big to keep around and Miller-Rabin is used instead.
+"""
+MAX_SIEVE_VALUE = 10 ** 14
+
+"""
+Below 2^32 a product of two residues fits in an uint64, so Miller-Rabin can run
+on whole arrays at once. Bases 2, 7 and 61 are deterministic below 4,759,123,141.
+"""
+UINT32_LIMIT = 1 << 32
+UINT32_BASES = (2, 7, 61)
+UINT32_SMALL_PRIMES = (2, 3, 5, 7, 11, 13, 17, 19, 23, 29, 31, 37, 41, 43, 47, 53, 59, 61)
+
+_base = np.array([], dtype=np.int64)
+_base_limit = 1
+
+
+def base_primes(limit: int) -> np.ndarray:
+    """
+    Every prime <= limit. The largest table computed so far is kept around and
+    sliced for smaller limits.
+    """
+    global _base, _base_limit
+    if limit > _base_limit:
+        size = max(limit, 2 * _base_limit)
+        sieve = np.ones(size + 1, dtype=bool)
+        sieve[:2] = False
+        sieve[4::2] = False
+        for p in range(3, isqrt(size) + 1, 2):
+            if sieve[p]:
+                sieve[p * p::2 * p] = False
+        _base, _base_limit = np.flatnonzero(sieve), size
+    return _base[:np.searchsorted(_base, limit, side="right")]
+
+
+def sieve_pays(count: int, high: int, cost: float) -> bool:
+    """
+    Whether sieving count numbers below high is cheaper than testing them with
+    a Miller-Rabin costing cost base prime steps per number.
+    """
+    root = isqrt(high - 1)
+    return high <= MAX_SIEVE_VALUE and count * cost >= root / log(max(root, 2))
+
+
+def sieve_segment(low: int, high: int) -> np.ndarray:
+    """
+    Boolean mask of the primes in [low, high).
+    """
+    low = max(low, 0)
+    flags = np.ones(max(high - low, 0), dtype=bool)
+    flags[:max(0, 2 - low)] = False
+    if high <= 4:
+        return flags
+    for p in base_primes(isqrt(high - 1)).tolist():
+        start = max(p * p, -(-low // p) * p)
+        flags[start - low::p] = False
+    return flags
+
+
+def _powmod(base: np.ndarray, exp: np.ndarray, mod: np.ndarray) -> np.ndarray:
+    result = np.ones_like(mod)
+    base = base % mod
+    while exp.any():
+        odd = (exp & 1).astype(bool)
+        result[odd] = result[odd] * base[odd] % mod[odd]
+        base = base * base % mod
+        exp = exp >> 1
+    return result
+
+
+def is_prime_uint32(n: np.ndarray) -> np.ndarray:
+    """
+    Vectorized deterministic Miller-Rabin for an uint64 array of values < 2^32.
+    """
+    flags = n >= 2
+    undecided = flags.copy()
+    for p in UINT32_SMALL_PRIMES:
+        divisible = undecided & (n % p == 0)
+        flags[divisible] = n[divisible] == p
+        undecided &= ~divisible
+    n = n[undecided]
+    if n.size == 0:
+        return flags
+
+    d = n - 1
+    s = np.zeros_like(n)
+    even = (d & 1) == 0
+    while even.any():
+        d[even] >>= 1
+        s[even] += 1
+        even = (d & 1) == 0
+    prime = np.ones(n.size, dtype=bool)
+    for a in UINT32_BASES:
+        x = _powmod(np.full_like(n, a), d, n)
+        passed = (x == 1) | (x == n - 1)
+        for r in range(1, int(s.max())):
+            x = x * x % n
+            passed |= (x == n - 1) & (r < s)
+        prime &= passed
+    flags[undecided] = prime
+    return flags
+
+
+def prime_flags(numbers) -> np.ndarray:
+    """
+    The isPrime "prime" flag for every number in numbers.
+    """
+    try:
+        values = np.asarray(numbers, dtype=np.int64)
+    except OverflowError:
+        return np.array([n == 1 or is_prime(n) for n in numbers], dtype=bool)
+    flags = values == 1
+    small = (values >= 2) & (values < UINT32_LIMIT)
+    flags[small] = is_prime_uint32(values[small].astype(np.uint64))
+    positions = np.flatnonzero(values >= UINT32_LIMIT)
+    if positions.size == 0:
+        return flags
+
+    segments = values[positions] // SEGMENT_SIZE
+    order = np.argsort(segments, kind="stable")
+    positions = positions[order]
+    segment_ids, counts = np.unique(segments[order], return_counts=True)
+    ends = np.cumsum(counts)
+    for segment, end, count in zip(segment_ids.tolist(), ends.tolist(), counts.tolist()):
+        selected = positions[end - count:end]
+        chunk = values[selected]
+        high = int(chunk.max()) + 1
+        if sieve_pays(count, high, MILLER_RABIN_COST):
+            low = segment * SEGMENT_SIZE
+            mask = sieve_segment(low, high)
+            flags[selected] = mask[chunk - low]
+        else:
+            flags[selected] = [is_prime(n) for n in chunk.tolist()]
+    return flags
+
+
+def range_flags(start: int, end: int) -> np.ndarray:
+    """
+    The isPrime "prime" flag for every number in [start, end].
+    """
+    flags = np.zeros(end - start + 1, dtype=bool)
+    if start <= 1 <= end:
+        flags[1 - start] = True
+    low = max(start, 2)
+    for segment_low in range(low, end + 1, SEGMENT_SIZE):
+        segment_high = min(segment_low + SEGMENT_SIZE, end + 1)
+        small = segment_high <= UINT32_LIMIT
+        cost = UINT32_MILLER_RABIN_COST if small else MILLER_RABIN_COST
+        if sieve_pays(segment_high - segment_low, segment_high, cost):
+            segment = sieve_segment(segment_low, segment_high)
+        elif small:
+            segment = is_prime_uint32(np.arange(segment_low, segment_high, dtype=np.uint64))
+        else:
+            segment = [is_prime(n) for n in range(segment_low, segment_high)]
+        flags[segment_low - start:segment_high - start] = segment
+    return flags
+
+
+def ndjson_segment(low: int, high: int, factors: bool) -> str:
+    """
+    NDJSON lines for [low, high): only the primes, or every number with its
+    isPrime factors when factors is True. Built in the worker so the request
+    thread only has to pass the text along.
+    """
+    flags = range_flags(low, high - 1)
+    if not factors:
+        return "".join(f'{{"number": {n}, "prime": true}}\n' for n in (np.flatnonzero(flags) + low).tolist())
+    numbers = range(low, high)
+    return "".join(
+        json.dumps({"number": n, "factors": f, "prime": p}) + "\n"
+        for n, f, p in zip(numbers, factor_lists(numbers), flags.tolist())
+    )
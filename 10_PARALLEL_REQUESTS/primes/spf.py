@@ -0,0 +1,152 @@
+"""
+Smallest prime factor (spf) table stored in a file that every worker process
+memory maps read only, so the pages are shared between processes through the
+OS page cache instead of being copied into each one.
+
+Only odd numbers are stored (index i is the number 2i + 1) and only factors up
+to sqrt(bound) are ever smallest prime factors of a composite, so every entry
+fits in an unsigned 16 bit integer. A 0 means the number is prime. That is one
+byte per integer, ~300MB for a bound of 3 * 10^8.
+
+Build a table with:
+
+    python -m primes.spf build --bound 300000000 --out spf.bin
+    python -m primes.spf info spf.bin
+"""
+import argparse
+import mmap
+import os
+import struct
+import sys
+import threading
+from array import array
+from math import isqrt
+from time import perf_counter
+
+MAGIC = b"SPF1"
+HEADER = struct.Struct("<4sc3xQ")  # magic, byte order, padding, bound
+MAX_BOUND = 2 ** 32 - 1
+
+
+def _base_primes(limit: int) -> list:
+    sieve = bytearray([1]) * (limit + 1)
+    sieve[:2] = b"\x00\x00"
+    for p in range(2, isqrt(limit) + 1):
+        if sieve[p]:
+            sieve[p * p::p] = bytes(len(range(p * p, limit + 1, p)))
+    return [p for p in range(3, limit + 1) if sieve[p]]
+
+
+def build(bound: int, path: str) -> None:
+    """
+    Sieves the smallest prime factor of every odd number up to bound and writes
+    the table to path. The file is written next to the target and then moved
+    into place so workers never attach to a half written table.
+    """
+    if not 3 <= bound <= MAX_BOUND:
+        raise ValueError(f"bound must be between 3 and {MAX_BOUND}.")
+    size = (bound + 1) // 2
+    table = array("H", bytes(2 * size))
+    """
+    Walking the primes from the largest to the smallest and overwriting means
+    the last prime to touch an entry is its smallest factor, so every step is
+    a single slice assignment done in C.
+    """
+    for p in reversed(_base_primes(isqrt(bound))):
+        start = (p * p - 1) // 2
+        table[start::p] = array("H", [p]) * len(range(start, size, p))
+
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(HEADER.pack(MAGIC, sys.byteorder[0].encode(), bound))
+        table.tofile(f)
+    os.replace(tmp, path)
+
+
+class SpfTable:
+    """
+    Read only view over a table built with build(). Nothing is read until the
+    first lookup, and then only the pages that are touched are loaded.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._mmap = None
+        self._view = None
+        self._bound = None
+
+    def _attach(self):
+        with self._lock:
+            if self._view is not None:
+                return
+            with open(self.path, "rb") as f:
+                mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            magic, order, bound = HEADER.unpack_from(mm)
+            if magic != MAGIC:
+                mm.close()
+                raise ValueError(f"{self.path} is not a spf table.")
+            if order != sys.byteorder[0].encode():
+                mm.close()
+                raise ValueError(f"{self.path} was built on a machine with a different byte order.")
+            self._mmap, self._bound = mm, bound
+            self._view = memoryview(mm)[HEADER.size:].cast("H")
+
+    @property
+    def bound(self) -> int:
+        if self._view is None:
+            self._attach()
+        return self._bound
+
+    def prime_factors(self, n: int) -> dict:
+        """
+        Returns {prime: exponent} for 1 <= n <= bound in O(log n) lookups.
+        """
+        if self._view is None:
+            self._attach()
+        if not 1 <= n <= self._bound:
+            raise ValueError(f"{n} is outside the table bound {self._bound}.")
+        factors = {}
+        twos = (n & -n).bit_length() - 1
+        if twos:
+            factors[2] = twos
+            n >>= twos
+        view = self._view
+        while n > 1:
+            p = view[n >> 1] or n
+            factors[p] = factors.get(p, 0) + 1
+            n //= p
+        return factors
+
+    def close(self):
+        with self._lock:
+            if self._view is not None:
+                self._view.release()
+                self._mmap.close()
+                self._view = self._mmap = None
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m primes.spf", description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    build_parser = commands.add_parser("build", help="build a table")
+    build_parser.add_argument("--bound", type=int, required=True)
+    build_parser.add_argument("--out", default="spf.bin")
+    info_parser = commands.add_parser("info", help="show the bound of a table")
+    info_parser.add_argument("path")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        start = perf_counter()
+        build(args.bound, args.out)
+        print(f"Built {args.out} (bound={args.bound}, {os.path.getsize(args.out)} bytes) "
+              f"in {perf_counter() - start:.1f}s.")
+    else:
+        table = SpfTable(args.path)
+        print(f"{args.path}: bound={table.bound}, {os.path.getsize(args.path)} bytes")
+        table.close()
+
+
+if __name__ == "__main__":
+    main()
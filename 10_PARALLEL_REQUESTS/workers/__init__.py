@@ -0,0 +1,178 @@
+import multiprocessing
+import os
+import threading
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+
+
+class QueueFull(Exception):
+    """
+    Raised when every worker is busy and the submission queue is full. The
+    route should answer with a 503 and ask the client to retry later.
+    """
+
+    def __init__(self, retry_after: int):
+        super().__init__("The server is busy, try again later.")
+        self.retry_after = retry_after
+
+
+def _count(busy, fn, args):
+    with busy.get_lock():
+        busy.value += 1
+    try:
+        return fn(*args)
+    finally:
+        with busy.get_lock():
+            busy.value -= 1
+
+
+"""
+Number of tasks currently running inside a pool process. It is a shared memory
+counter handed to every process when it starts, since it can't be pickled along
+with the tasks.
+"""
+_busy = None
+
+
+def _init_process(busy, initializer, initargs):
+    global _busy
+    _busy = busy
+    if initializer is not None:
+        initializer(*initargs)
+
+
+def _run_in_process(fn, args):
+    return _count(_busy, fn, args)
+
+
+class Executor:
+    """
+    Runs CPU heavy functions away from the request thread.
+
+    kind is "process" (a pool sized to the cores, so the work is not serialized
+    by the GIL), "thread" or "inline" (run in the calling thread, handy while
+    debugging). At most workers + queue_size tasks are accepted at a time, past
+    that submit() raises QueueFull instead of letting the latency grow forever.
+    The pool is only started on the first submit.
+    """
+
+    def __init__(self, kind="process", workers=None, queue_size=None, retry_after=1,
+                 initializer=None, initargs=()):
+        if kind not in ("process", "thread", "inline"):
+            raise ValueError(f"Unknown executor kind '{kind}'.")
+        self.kind = kind
+        self.workers = workers or os.cpu_count() or 1
+        self.queue_size = self.workers * 2 if queue_size is None else queue_size
+        self.retry_after = retry_after
+        self._initializer = initializer
+        self._initargs = initargs
+        self._slots = threading.BoundedSemaphore(self.workers + self.queue_size)
+        self._lock = threading.Lock()
+        self._pool = None
+        self._busy = multiprocessing.Value("i", 0)
+        self._in_flight = 0
+        self._completed = 0
+        self._rejected = 0
+
+    def _get_pool(self):
+        with self._lock:
+            if self._pool is None:
+                if self.kind == "process":
+                    self._pool = ProcessPoolExecutor(
+                        self.workers, initializer=_init_process,
+                        initargs=(self._busy, self._initializer, self._initargs))
+                elif self.kind == "thread":
+                    self._pool = ThreadPoolExecutor(
+                        self.workers, initializer=self._initializer, initargs=self._initargs)
+            return self._pool
+
+    def _done(self, future):
+        with self._lock:
+            self._in_flight -= 1
+            self._completed += 1
+        self._slots.release()
+
+    def submit(self, fn, *args, block=False, timeout=None) -> Future:
+        """
+        Queues fn(*args) and returns its future. By default this fails fast with
+        QueueFull, pass block=True to wait (up to timeout seconds) for a slot.
+        """
+        if not self._slots.acquire(blocking=block, timeout=timeout if block else None):
+            with self._lock:
+                self._rejected += 1
+            raise QueueFull(self.retry_after)
+        with self._lock:
+            self._in_flight += 1
+
+        pool = self._get_pool()
+        try:
+            if self.kind == "process":
+                future = pool.submit(_run_in_process, fn, args)
+            elif self.kind == "thread":
+                future = pool.submit(_count, self._busy, fn, args)
+        except Exception:
+            self._done(None)
+            raise
+        if self.kind == "inline":
+            future = Future()
+            try:
+                future.set_result(_count(self._busy, fn, args))
+            except Exception as e:
+                future.set_exception(e)
+        future.add_done_callback(self._done)
+        return future
+
+    def run(self, fn, *args, timeout=None):
+        """
+        Submits fn(*args) and waits for the result.
+        """
+        return self.submit(fn, *args).result(timeout)
+
+    def imap(self, fn, args, window=None):
+        """
+        Runs fn(*a) for every a in args, keeping at most window tasks in flight,
+        and returns a generator of the results in order. The first window is
+        submitted straight away so a full queue raises QueueFull here rather
+        than halfway through a streamed response.
+        """
+        args = iter(args)
+        window = window or self.workers
+        pending = deque()
+        for a in args:
+            pending.append(self.submit(fn, *a, block=bool(pending)))
+            if len(pending) >= window:
+                break
+
+        def results():
+            try:
+                while pending:
+                    result = pending.popleft().result()
+                    a = next(args, None)
+                    if a is not None:
+                        pending.append(self.submit(fn, *a, block=True))
+                    yield result
+            finally:
+                for future in pending:
+                    future.cancel()
+        return results()
+
+    def stats(self) -> dict:
+        with self._lock:
+            in_flight, completed, rejected = self._in_flight, self._completed, self._rejected
+        busy = min(self._busy.value, self.workers)
+        return {
+            "kind": self.kind,
+            "workers": self.workers,
+            "busy": busy,
+            "utilization": round(busy / self.workers, 3),
+            "queue_size": self.queue_size,
+            "queue_depth": max(in_flight - busy, 0),
+            "completed": completed,
+            "rejected": rejected,
+        }
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=wait)
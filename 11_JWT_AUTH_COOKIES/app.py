@@ -2,13 +2,193 @@ from flask import make_response, request, jsonify, views
 from app import app, db
 from argon2 import PasswordHasher
 from datetime import datetime, timedelta
-from models import User
+from models import RevokedToken, User
+from bulk import UserImport, parse_ndjson
+from cache import CredentialCache, TokenCache, UserVersions
+from passwords import BulkHasher, PasswordPool, PoolBusy
+from revocation import RevocationList, TableStore
+from sqlalchemy import event, or_
+from sqlalchemy.orm import Session, object_session
+from collections import namedtuple
 import jwt
 from functools import wraps
+from uuid import uuid4
+from werkzeug.http import http_date
 
-hasher = PasswordHasher(salt_len=12)
+hasher = PasswordHasher(
+    time_cost=app.config['ARGON2_TIME_COST'],
+    memory_cost=app.config['ARGON2_MEMORY_COST'],
+    parallelism=app.config['ARGON2_PARALLELISM'],
+    salt_len=12
+)
+passwords = PasswordPool(
+    hasher,
+    workers=app.config['PASSWORD_WORKERS'],
+    queue_size=app.config['PASSWORD_QUEUE_SIZE'],
+    timeout=app.config['PASSWORD_TIMEOUT']
+)
+bulk_hasher = BulkHasher(hasher, app.config['IMPORT_HASH_WORKERS'])
 SECRETE = 'dfghjkla56789okmnbdfgh9no12uw6dcvbnnnmo'
 TOKEN_KEY = 'jwt'
+TOKEN_LIFETIME = timedelta(days=3)
+
+token_cache = TokenCache(app.config['TOKEN_CACHE_SIZE'], app.config['TOKEN_CACHE_TTL'])
+revoked_tokens = RevocationList(
+    TableStore(db.engine, RevokedToken),
+    app.config['REVOCATION_CAPACITY'],
+    app.config['REVOCATION_ERROR_RATE'],
+    app.config['REVOCATION_SYNC_INTERVAL']
+)
+credentials = CredentialCache(
+    app.config['CREDENTIAL_CACHE_SIZE'],
+    app.config['CREDENTIAL_CACHE_TTL'],
+    app.config['CREDENTIAL_NEGATIVE_TTL']
+)
+
+class Credentials(namedtuple('Credentials', ['id', 'username', 'email', 'password', 'created_at', 'updated_at', 'version'])):
+    """
+    The columns of a user /login needs, enough to make the token and the
+    response without loading the user.
+    """
+    __slots__ = ()
+
+    @classmethod
+    def of(cls, user):
+        return cls(*(getattr(user, field) for field in cls._fields))
+
+    def to_json(self):
+        return User.to_json(self)
+
+def load_credentials(login):
+    """
+    Finds the user by username or email with one query over the two unique
+    indexes, loading only the columns /login needs. A username match wins
+    over an email match.
+    """
+    rows = db.session.query(*(getattr(User, field) for field in Credentials._fields)).filter(
+        or_(User.username == login, User.email == login)
+    ).limit(2).all()
+    rows.sort(key=lambda row: row.username != login)
+    return Credentials(*rows[0]) if rows else None
+
+def find_credentials(login):
+    return credentials.get(login, load_credentials)
+
+def load_user_version(user_id):
+    row = db.session.query(User.version).filter_by(id=user_id).first()
+    return row.version if row else None
+
+user_versions = UserVersions(load_user_version, app.config['USER_VERSION_REFRESH'])
+
+def record_user_change(user, kind):
+    # recorded at flush, the caches are only invalidated after the commit
+    change = (kind, user.id, user.version, user.username, user.email)
+    object_session(user).info.setdefault('users_changed', []).append(change)
+
+@event.listens_for(User, 'after_insert')
+def user_inserted(mapper, connection, user):
+    record_user_change(user, 'insert')
+
+@event.listens_for(User, 'after_update')
+def user_updated(mapper, connection, user):
+    record_user_change(user, 'update')
+
+@event.listens_for(User, 'after_delete')
+def user_deleted(mapper, connection, user):
+    record_user_change(user, 'delete')
+
+@event.listens_for(Session, 'after_commit')
+def invalidate_user_caches(session):
+    """
+    Invalidated once the rows are visible to the other requests, not at
+    flush: a request reading the user in between would load the old row
+    and cache it under the new version.
+    """
+    for kind, user_id, version, username, email in session.info.pop('users_changed', []):
+        if kind == 'update':
+            token_cache.invalidate_user(user_id)
+            user_versions.set(user_id, version)
+        elif kind == 'delete':
+            token_cache.invalidate_user(user_id)
+            user_versions.discard(user_id)
+        credentials.invalidate(user_id, username, email)
+
+@event.listens_for(Session, 'after_rollback')
+def forget_user_changes(session):
+    session.info.pop('users_changed', None)
+
+def user_claims(user):
+    """
+    user.to_json() with the dates formatted the way jsonify does it, so a
+    response built from the token is the same as one built from the database.
+    """
+    return {
+        key: http_date(value) if isinstance(value, datetime) else value
+        for key, value in user.to_json().items()
+    }
+
+def create_token(user):
+    payload ={
+        'id': user.id,
+        'username': user.username,
+        'exp': datetime.utcnow() + TOKEN_LIFETIME,
+        'jti': uuid4().hex
+    }
+    if app.config['STATELESS_USER_CLAIMS']:
+        payload['user'] = user_claims(user)
+        payload['ver'] = user.version
+        user_versions.set(user.id, user.version)
+    return jwt.encode(payload, SECRETE, algorithm="HS256")
+
+def authenticate(token):
+    """
+    Verifies the token and returns (payload, user json). Verified tokens are
+    cached so the next requests with the same token skip jwt.decode and the
+    user query. Tokens carrying current user claims (STATELESS_USER_CLAIMS)
+    are answered without the database, stale claims fall back to it. Tokens
+    revoked on logout are rejected.
+    """
+    cached = token_cache.get(token)
+    if cached:
+        if revoked_tokens.is_revoked(cached[0].get('jti')):
+            raise jwt.InvalidTokenError('Token has been revoked.')
+        return cached
+    payload = jwt.decode(token, SECRETE, algorithms=["HS256"])
+    if revoked_tokens.is_revoked(payload.get('jti')):
+        raise jwt.InvalidTokenError('Token has been revoked.')
+    version = token_cache.version(payload.get('id'))
+    if 'user' in payload and user_versions.get(payload.get('id')) == payload.get('ver'):
+        # the claims are still current, no need to load the user
+        token_cache.set(token, payload, payload['user'], version)
+        return payload, payload['user']
+    user = User.query.filter_by(id=payload.get('id')).first()
+    if user is None:
+        raise jwt.InvalidTokenError('User does not exist.')
+    user_json = user.to_json()
+    token_cache.set(token, payload, user_json, version)
+    return payload, user_json
+
+def revoke(token):
+    """
+    Revokes the token until it expires, so logging out invalidates it even if
+    someone kept a copy of the cookie.
+    """
+    try:
+        payload = jwt.decode(token, SECRETE, algorithms=["HS256"])
+    except jwt.InvalidTokenError:
+        return
+    if payload.get('jti'):
+        revoked_tokens.revoke(payload['jti'], payload.get('exp', (datetime.utcnow() + TOKEN_LIFETIME).timestamp()))
+    token_cache.discard(token)
+
+def busy(e):
+    res = make_response(jsonify({
+        'code': '503',
+        'message': str(e),
+        'timestamp': datetime.now(),
+    }), 503)
+    res.headers['Retry-After'] = str(e.retry_after)
+    return res
 
 def authorize(f):
     @wraps(f)
@@ -17,13 +197,12 @@ def authorize(f):
         token = cookies.get(TOKEN_KEY)
         if token:
             try:
-                payload = jwt.decode(token, SECRETE, algorithms=["HS256"])
-                user = User.query.filter_by(id=payload.get('id')).first()
+                payload, user = authenticate(token)
                 res =  make_response(jsonify({
                     'timestamp': datetime.now(),
                     'code': 200,
                     'message': "User.",
-                    'user': user.to_json()
+                    'user': user
                 }), 200)
                 return f(self, res, *args, **kws) 
             except Exception as e:
@@ -50,13 +229,12 @@ class Auth(views.MethodView):
         token = cookies.get(TOKEN_KEY)
         if token:
             try:
-                payload = jwt.decode(token, SECRETE, algorithms=["HS256"])
-                user = User.query.filter_by(id=payload.get('id')).first()
+                payload, user = authenticate(token)
                 res =  make_response(jsonify({
                     'timestamp': datetime.now(),
                     'code': 200,
                     'message': "User.",
-                    'user': user.to_json()
+                    'user': user
                 }), 200)
                 return res
             except Exception as e:
@@ -78,18 +256,23 @@ class Auth(views.MethodView):
             if request.is_json:
                 try:
                     data = request.get_json()
-                    user = User.query.filter_by(username=data.get('usernameOrEmail')).first()
-                    user = user if user else User.query.filter_by(email=data.get('usernameOrEmail')).first()
-                    if user:
+                    found = find_credentials(data.get('usernameOrEmail'))
+                    if found:
                         # login
                         # create a jwt token and store it in a cookie
                         try:
-                            hasher.verify(user.password, data.get('password'))
-                            payload ={
-                                'id': user.id,
-                                'username': user.username
-                            }
-                            token = jwt.encode(payload, SECRETE, algorithm="HS256")
+                            passwords.verify(found.password, data.get('password'))
+                            user = found
+                            if hasher.check_needs_rehash(found.password):
+                                # the argon2 settings changed since this hash was made
+                                user = User.query.filter_by(id=found.id).first()
+                                if user is None or user.password != found.password:
+                                    # changed by another process since the row was cached
+                                    credentials.invalidate(found.id)
+                                    raise ValueError('Invalid credentials.')
+                                user.password = passwords.hash(data.get('password'))
+                                db.session.commit()
+                            token = create_token(user)
                             res =  make_response(jsonify({
                                 'timestamp': datetime.now(),
                                 'code': 200,
@@ -99,10 +282,12 @@ class Auth(views.MethodView):
                             res.set_cookie(
                                 TOKEN_KEY, 
                                 token,
-                                timedelta(days=3), 
+                                TOKEN_LIFETIME, 
                                 samesite="Lax"
                             )
                             return res
+                        except PoolBusy as e:
+                            return busy(e)
                         except Exception as e:
                             return make_response(jsonify({
                                 'timestamp': datetime.now(),
@@ -131,6 +316,9 @@ class Auth(views.MethodView):
                     }), 500) 
         
         elif request.path == '/logout':
+            token = request.cookies.get(TOKEN_KEY)
+            if token:
+                revoke(token)
             res =  make_response(jsonify({
                 'timestamp': datetime.now(),
                 'code': 200,
@@ -144,16 +332,15 @@ class Auth(views.MethodView):
             if request.is_json:
                 try:
                     data = request.get_json()
-                    hashedPassword = hasher.hash(data.get('password'))
+                    hashedPassword = passwords.hash(data.get('password'))
                     user = User(data.get('username'), data.get('email'), hashedPassword)
                     db.session.add(user)
                     db.session.commit()
+                    row = Credentials.of(user)
+                    credentials.put(user.username, row)
+                    credentials.put(user.email, row)
                     # Put the token into the session
-                    payload ={
-                        'id': user.id,
-                        'username': user.username
-                    }
-                    token = jwt.encode(payload, SECRETE, algorithm="HS256")
+                    token = create_token(user)
                     
                     res = make_response(jsonify({
                         'timestamp': datetime.now(),
@@ -164,10 +351,12 @@ class Auth(views.MethodView):
                     res.set_cookie(
                         TOKEN_KEY, 
                         token,
-                        timedelta(days=3), 
+                        TOKEN_LIFETIME, 
                         samesite="Lax"
                     )
                     return res
+                except PoolBusy as e:
+                    return busy(e)
                 except Exception as e:
                     return make_response(jsonify({
                         'code': '500',
@@ -189,6 +378,49 @@ class Auth(views.MethodView):
             }), 404)
 
             
+def forget_imported(values):
+    # core inserts don't fire the mapper events, drop the negative entries by hand
+    credentials.invalidate(None, *[row[key] for row in values for key in ('username', 'email')])
+
+
+class Import(views.MethodView):
+    @authorize
+    def post(self, res):
+        if res.status_code != 200:
+            return res
+        if request.mimetype in ('application/x-ndjson', 'application/jsonl'):
+            rows = parse_ndjson(request.stream)
+        elif request.is_json and isinstance(request.get_json(silent=True), list):
+            rows = request.get_json()
+        else:
+            return make_response(jsonify({
+                'code': '500',
+                'message': 'A json array or ndjson allowed.',
+                'timestamp': datetime.now(),
+            }), 500)
+        try:
+            report = UserImport(
+                db.session,
+                User,
+                bulk_hasher.hash_many,
+                app.config['IMPORT_CHUNK_SIZE'],
+                on_insert=forget_imported
+            ).run(rows)
+            return make_response(jsonify({
+                'timestamp': datetime.now(),
+                'code': 200,
+                'message': f"Imported {report['created']} of {report['rows']} users.",
+                **report
+            }), 200)
+        except Exception as e:
+            db.session.rollback()
+            return make_response(jsonify({
+                'code': '500',
+                'message': str(e),
+                'timestamp': datetime.now(),
+            }), 500)
+
+
 class App(views.MethodView):
     decorators = [authorize]
     
@@ -197,13 +429,24 @@ class App(views.MethodView):
         return jsonify({'hello': 1})
     
 
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    return make_response(jsonify({
+        'timestamp': datetime.now(),
+        'code': 200,
+        'passwords': passwords.stats()
+    }), 200)
+
+
 auth_view = Auth.as_view('auth')
 app_view = App.as_view('app')
+import_view = Import.as_view('import')
 
 app.add_url_rule('/login', methods=['POST'], view_func=auth_view)
 app.add_url_rule('/logout', methods=['POST'], view_func=auth_view)
 app.add_url_rule('/register', methods=['POST'], view_func=auth_view)
 app.add_url_rule('/user', methods=['GET'], view_func=auth_view)
+app.add_url_rule('/users/import', methods=['POST'], view_func=import_view)
 app.add_url_rule('/', methods=['GET'], view_func=app_view)
 
 if __name__ == "__main__":
@@ -1,10 +1,42 @@
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from datetime import timedelta
+from sqlite_engine import configure
 app = Flask(__name__)
 app.secret_key = "abcd"
 
 app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///users.db'
 app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
 app.permanent_session_lifetime = timedelta(days=7)
+
+# Verified tokens are cached for TOKEN_CACHE_TTL seconds (never past their exp).
+app.config['TOKEN_CACHE_SIZE'] = 1024
+app.config['TOKEN_CACHE_TTL'] = 60
+
+# argon2 cost settings, run `python -m passwords.calibrate` to pick them for this host.
+app.config['ARGON2_TIME_COST'] = 3
+app.config['ARGON2_MEMORY_COST'] = 65536
+app.config['ARGON2_PARALLELISM'] = 4
+# Hashing runs on its own small pool so a login burst can't starve the other routes.
+app.config['PASSWORD_WORKERS'] = 2
+app.config['PASSWORD_QUEUE_SIZE'] = 16
+app.config['PASSWORD_TIMEOUT'] = 5
+# Put the public user fields and a version in the token so /user doesn't need the database.
+app.config['STATELESS_USER_CLAIMS'] = False
+app.config['USER_VERSION_REFRESH'] = 30
+# Tokens revoked on logout, sized for REVOCATION_CAPACITY logouts per token lifetime.
+# Logouts on other processes are picked up every REVOCATION_SYNC_INTERVAL seconds.
+app.config['REVOCATION_CAPACITY'] = 100000
+app.config['REVOCATION_ERROR_RATE'] = 0.001
+app.config['REVOCATION_SYNC_INTERVAL'] = 1
+# Credential rows looked up by /login, unknown logins are cached for CREDENTIAL_NEGATIVE_TTL.
+app.config['CREDENTIAL_CACHE_SIZE'] = 4096
+app.config['CREDENTIAL_CACHE_TTL'] = 30
+app.config['CREDENTIAL_NEGATIVE_TTL'] = 5
+# POST /users/import hashes on IMPORT_HASH_WORKERS processes (None is one per cpu)
+# and inserts IMPORT_CHUNK_SIZE users per transaction.
+app.config['IMPORT_HASH_WORKERS'] = None
+app.config['IMPORT_CHUNK_SIZE'] = 500
+# WAL, pragmas and a connection pool for the threaded server
+configure(app)
 db = SQLAlchemy(app)
\ No newline at end of file
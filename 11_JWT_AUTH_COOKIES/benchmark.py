@@ -0,0 +1,99 @@
+"""
+Microbenchmark for the logout revocation check that runs on every
+authenticated request, against a revoked_token table in a temporary SQLite
+database.
+
+    python benchmark.py
+    python benchmark.py --revoked 100000 --lookups 1000000
+"""
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+from uuid import uuid4
+
+import jwt
+from sqlalchemy import Column, Float, Integer, String, create_engine
+from sqlalchemy.orm import declarative_base, sessionmaker
+
+from revocation import RevocationList, TableStore
+
+Base = declarative_base()
+
+
+class RevokedToken(Base):
+    # same table as models.RevokedToken, without the app
+    __tablename__ = 'revoked_token'
+    __table_args__ = {'sqlite_autoincrement': True}
+
+    id = Column(Integer, primary_key=True)
+    jti = Column(String(32), unique=True, nullable=False)
+    exp = Column(Float, nullable=False, index=True)
+
+    def __init__(self, jti, exp):
+        self.jti = jti
+        self.exp = exp
+
+SECRET = 'benchmark-secret-benchmark-secret-123'
+
+
+def per_call_ns(fn, keys):
+    start = time.perf_counter_ns()
+    for key in keys:
+        fn(key)
+    return (time.perf_counter_ns() - start) / len(keys)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--revoked', type=int, default=100000, help='tokens revoked before measuring')
+    parser.add_argument('--lookups', type=int, default=200000)
+    parser.add_argument('--error-rate', type=float, default=0.001)
+    args = parser.parse_args()
+
+    exp = time.time() + 3600
+    directory = tempfile.mkdtemp()
+    engine = create_engine(f"sqlite:///{os.path.join(directory, 'revoked.db')}")
+    Base.metadata.create_all(engine)
+    session = sessionmaker(engine)()
+    store = TableStore(engine, RevokedToken)
+    revoked_ids = [uuid4().hex for _ in range(args.revoked)]
+    session.bulk_insert_mappings(RevokedToken, [{'jti': jti, 'exp': exp} for jti in revoked_ids])
+    session.commit()
+
+    try:
+        start = time.perf_counter()
+        revoked = RevocationList(store, capacity=args.revoked, error_rate=args.error_rate, prune_interval=3600)
+        revoked.is_revoked('warm-up')
+        build_ms = (time.perf_counter() - start) * 1000
+
+        sample = [uuid4().hex for _ in range(1000)]
+        revoke_ns = per_call_ns(lambda jti: revoked.revoke(jti, exp), sample)
+
+        valid_ids = [uuid4().hex for _ in range(args.lookups)]
+        hits = revoked_ids[:min(args.lookups, 20000)]
+        false_positives = sum(jti in revoked._filter for jti in valid_ids)
+        tokens = [jwt.encode({'id': 1, 'exp': exp, 'jti': jti}, SECRET, algorithm='HS256') for jti in valid_ids[:10000]]
+        decode = lambda token: jwt.decode(token, SECRET, algorithms=['HS256'])
+        print(json.dumps({
+            'revoked': len(revoked),
+            'filter_bits': revoked._filter.size,
+            'filter_hashes': revoked._filter.hashes,
+            'filter_build_ms': round(build_ms, 1),
+            'revoke_ns': round(revoke_ns),
+            'check_valid_token_ns': round(per_call_ns(revoked.is_revoked, valid_ids)),
+            'check_revoked_token_ns': round(per_call_ns(revoked.is_revoked, hits)),
+            'store_only_ns': round(per_call_ns(store.get, valid_ids[:20000])),
+            'false_positive_rate': round(false_positives / len(valid_ids), 5),
+            'jwt_decode_ns': round(per_call_ns(decode, tokens)),
+        }, indent=2))
+    finally:
+        session.close()
+        engine.dispose()
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
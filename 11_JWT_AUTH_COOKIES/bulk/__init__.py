@@ -0,0 +1,164 @@
+import json
+from itertools import islice
+
+from sqlalchemy import or_
+from sqlalchemy.exc import IntegrityError
+
+FIELDS = ('username', 'email', 'password')
+# SQLite builds before 3.32 allow at most 999 parameters per statement, the
+# lookup of taken names binds two per row
+LOOKUP_SIZE = 499
+
+
+def parse_ndjson(lines):
+    """
+    Yields one row per non blank line. A line that isn't valid json is yielded
+    as the ValueError so it is reported as an invalid row instead of stopping
+    the import.
+    """
+    for line in lines:
+        if isinstance(line, bytes):
+            line = line.decode('utf-8', 'replace')
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError as e:
+            yield ValueError(f'Invalid json: {e}')
+
+
+def chunks(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def validate(row):
+    if isinstance(row, Exception):
+        return str(row)
+    if not isinstance(row, dict):
+        return 'Every row must be an object.'
+    for field in FIELDS:
+        if not isinstance(row.get(field), str) or not row[field]:
+            return f'"{field}" is required.'
+    return None
+
+
+class UserImport:
+    """
+    Imports users chunk by chunk. For each chunk the usernames and emails that
+    are already taken are looked up with one query, the passwords are hashed
+    with hash_many and the remaining rows are inserted with one executemany
+    and one commit. If the insert still hits a unique constraint (someone
+    registered in between) the chunk is inserted again row by row, each in a
+    savepoint, so only the conflicting rows are rejected. on_insert is called
+    with the values of the rows that were created.
+    """
+
+    def __init__(self, session, model, hash_many, chunk_size=500, on_insert=None):
+        self.session = session
+        self.model = model
+        self.hash_many = hash_many
+        self.chunk_size = chunk_size
+        self.on_insert = on_insert
+        self.rows = 0
+        self.created = 0
+        self.rejected = []
+        self._usernames = set()
+        self._emails = set()
+
+    def run(self, rows):
+        for chunk in chunks(enumerate(rows), self.chunk_size):
+            self.rows += len(chunk)
+            self._import(chunk)
+        return self.to_json()
+
+    def to_json(self):
+        return {
+            'rows': self.rows,
+            'created': self.created,
+            'rejected': sorted(self.rejected, key=lambda r: r['row']),
+        }
+
+    def _reject(self, index, row, status, message, field=None):
+        self.rejected.append({
+            'row': index,
+            'username': row.get('username') if isinstance(row, dict) else None,
+            'status': status,
+            'field': field,
+            'message': message,
+        })
+
+    def _import(self, chunk):
+        accepted = []
+        for index, row in chunk:
+            error = validate(row)
+            if error:
+                self._reject(index, row, 'invalid', error)
+            elif row['username'] in self._usernames:
+                self._reject(index, row, 'conflict', 'Duplicate username in the import.', 'username')
+            elif row['email'] in self._emails:
+                self._reject(index, row, 'conflict', 'Duplicate email in the import.', 'email')
+            else:
+                self._usernames.add(row['username'])
+                self._emails.add(row['email'])
+                accepted.append((index, row))
+        if not accepted:
+            return
+
+        model = self.model
+        taken = []
+        for part in chunks(accepted, LOOKUP_SIZE):
+            taken += self.session.query(model.username, model.email).filter(or_(
+                model.username.in_([row['username'] for _, row in part]),
+                model.email.in_([row['email'] for _, row in part]),
+            )).all()
+        taken_usernames = {username for username, _ in taken}
+        taken_emails = {email for _, email in taken}
+        rows = []
+        for index, row in accepted:
+            if row['username'] in taken_usernames:
+                self._reject(index, row, 'conflict', 'Username already exists.', 'username')
+            elif row['email'] in taken_emails:
+                self._reject(index, row, 'conflict', 'Email already exists.', 'email')
+            else:
+                rows.append((index, row))
+        if not rows:
+            return
+
+        hashes = self.hash_many([row['password'] for _, row in rows])
+        values = [
+            {'username': row['username'], 'email': row['email'], 'password': hashed}
+            for (_, row), hashed in zip(rows, hashes)
+        ]
+        insert = model.__table__.insert()
+        try:
+            self.session.execute(insert, values)
+            self.session.commit()
+            self.created += len(values)
+            self._inserted(values)
+        except IntegrityError:
+            self.session.rollback()
+            self._insert_each(insert, rows, values)
+
+    def _inserted(self, values):
+        if self.on_insert is not None and values:
+            self.on_insert(values)
+
+    def _insert_each(self, insert, rows, values):
+        inserted = []
+        for (index, row), value in zip(rows, values):
+            try:
+                with self.session.begin_nested():
+                    self.session.execute(insert, [value])
+                self.created += 1
+                inserted.append(value)
+            except IntegrityError as e:
+                message = str(e.orig)
+                field = next((f for f in ('username', 'email') if f in message), None)
+                self._reject(index, row, 'conflict', f'{(field or "User").capitalize()} already exists.', field)
+        self.session.commit()
+        self._inserted(inserted)
@@ -0,0 +1,180 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class TokenCache:
+    """
+    Bounded LRU cache of verified tokens. It maps the raw token to the decoded
+    payload and the serialized user so an authenticated request doesn't have to
+    verify the signature and query the user again.
+
+    Entries live for at most `ttl` seconds and never past the `exp` claim of
+    the token. invalidate_user() drops every token of a user when their row
+    changes.
+    """
+
+    def __init__(self, max_size=1024, ttl=60):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._by_user = {}
+        self._versions = {}
+
+    def version(self, user_id):
+        """
+        Read this before loading the user and pass it to set(), so a row that
+        changed in between is not cached.
+        """
+        with self._lock:
+            return self._versions.get(user_id, 0)
+
+    def get(self, token):
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None:
+                return None
+            expires, payload, user = entry
+            if expires < time.monotonic():
+                self._remove(token)
+                return None
+            self._entries.move_to_end(token)
+            return payload, user
+
+    def set(self, token, payload, user, version=0):
+        ttl = self.ttl
+        if payload.get('exp') is not None:
+            ttl = min(ttl, payload['exp'] - time.time())
+        if ttl <= 0:
+            return
+        user_id = payload.get('id')
+        with self._lock:
+            if self._versions.get(user_id, 0) != version:
+                return
+            self._remove(token)
+            self._entries[token] = (time.monotonic() + ttl, payload, user)
+            self._by_user.setdefault(user_id, set()).add(token)
+            while len(self._entries) > self.max_size:
+                self._remove(next(iter(self._entries)))
+
+    def discard(self, token):
+        with self._lock:
+            self._remove(token)
+
+    def invalidate_user(self, user_id):
+        with self._lock:
+            self._versions[user_id] = self._versions.get(user_id, 0) + 1
+            for token in self._by_user.pop(user_id, set()):
+                self._entries.pop(token, None)
+
+    def _remove(self, token):
+        entry = self._entries.pop(token, None)
+        if entry is not None:
+            user_id = entry[1].get('id')
+            tokens = self._by_user.get(user_id)
+            if tokens is not None:
+                tokens.discard(token)
+                if not tokens:
+                    del self._by_user[user_id]
+
+
+class UserVersions:
+    """
+    Small in-memory map of user id -> version, so a token that carries the
+    user's claims can be checked without touching the database. set() is called
+    whenever this process changes a user, and entries older than `refresh`
+    seconds are loaded again to pick up changes made by other processes.
+    """
+
+    def __init__(self, loader, refresh=30):
+        self.loader = loader
+        self.refresh = refresh
+        self._lock = threading.Lock()
+        self._versions = {}
+
+    def get(self, user_id):
+        with self._lock:
+            entry = self._versions.get(user_id)
+        if entry is not None and entry[1] > time.monotonic():
+            return entry[0]
+        version = self.loader(user_id)
+        self.set(user_id, version)
+        return version
+
+    def set(self, user_id, version):
+        with self._lock:
+            self._versions[user_id] = (version, time.monotonic() + self.refresh)
+
+    def discard(self, user_id):
+        with self._lock:
+            self._versions.pop(user_id, None)
+
+
+class CredentialCache:
+    """
+    LRU cache of the credential rows /login looks up, keyed by what was typed
+    in (a username or an email). Logins that match no user are cached as well,
+    for negative_ttl seconds, so a storm of failed logins for the same names
+    doesn't reach the database. invalidate() is called whenever a user row is
+    inserted, changed or deleted.
+    """
+
+    def __init__(self, max_size=4096, ttl=30, negative_ttl=5):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._by_user = {}
+        self._generation = 0
+
+    def get(self, login, load):
+        """
+        Returns the cached row for login, or calls load(login) and caches what
+        it returns (None included).
+        """
+        with self._lock:
+            entry = self._entries.get(login)
+            if entry is not None and entry[0] > time.monotonic():
+                self._entries.move_to_end(login)
+                return entry[1]
+            generation = self._generation
+        row = load(login)
+        self._set(login, row, generation)
+        return row
+
+    def put(self, login, row):
+        with self._lock:
+            generation = self._generation
+        self._set(login, row, generation)
+
+    def invalidate(self, user_id=None, *logins):
+        with self._lock:
+            self._generation += 1
+            for login in self._by_user.pop(user_id, set()) | set(logins):
+                self._remove(login)
+
+    def _set(self, login, row, generation):
+        ttl = self.ttl if row is not None else self.negative_ttl
+        if ttl <= 0:
+            return
+        with self._lock:
+            if self._generation != generation:
+                # a user changed while the row was loaded, it may be stale
+                return
+            self._remove(login)
+            self._entries[login] = (time.monotonic() + ttl, row)
+            if row is not None:
+                self._by_user.setdefault(row.id, set()).add(login)
+            while len(self._entries) > self.max_size:
+                self._remove(next(iter(self._entries)))
+
+    def _remove(self, login):
+        entry = self._entries.pop(login, None)
+        if entry is not None and entry[1] is not None:
+            logins = self._by_user.get(entry[1].id)
+            if logins is not None:
+                logins.discard(login)
+                if not logins:
+                    del self._by_user[entry[1].id]
@@ -1,4 +1,5 @@
 from app import db
+from sqlalchemy import inspect, text
 
 class User(db.Model):
     id = db.Column("id", db.Integer(), primary_key=True, nullable=False)
@@ -7,6 +8,10 @@ class User(db.Model):
     password = db.Column(db.String(500),  nullable=False)
     created_at = db.Column(db.DateTime, server_default=db.func.now())
     updated_at = db.Column(db.DateTime, server_default=db.func.now(), server_onupdate=db.func.now())
+    # bumped by SQLAlchemy on every update, tokens carrying the user's claims are checked against it
+    version = db.Column(db.Integer, nullable=False, server_default='1')
+
+    __mapper_args__ = {'version_id_col': version}
      
     def __init__(self, username, email,  password):
         self.username = username
@@ -26,7 +31,29 @@ class User(db.Model):
         }
         
     
+
+class RevokedToken(db.Model):
+    """
+    A token revoked on logout, kept until it expires. AUTOINCREMENT on SQLite
+    so an id is never reused after pruning, the processes sync by id.
+    """
+    __tablename__ = 'revoked_token'
+    __table_args__ = {'sqlite_autoincrement': True}
+
+    id = db.Column(db.Integer(), primary_key=True)
+    jti = db.Column(db.String(32), unique=True, nullable=False)
+    exp = db.Column(db.Float(), nullable=False, index=True)
+
+    def __init__(self, jti, exp):
+        self.jti = jti
+        self.exp = exp
+
     
 # create the tables
 
-db.create_all()
\ No newline at end of file
+db.create_all()
+
+# databases created before the version column existed
+if 'version' not in [column['name'] for column in inspect(db.engine).get_columns('user')]:
+    with db.engine.begin() as connection:
+        connection.execute(text("ALTER TABLE user ADD COLUMN version INTEGER NOT NULL DEFAULT 1"))
\ No newline at end of file
@@ -0,0 +1,179 @@
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, TimeoutError
+
+from argon2 import PasswordHasher
+
+
+class PoolBusy(Exception):
+    """
+    Raised when the password pool queue is full or a hash took longer than the
+    timeout. The route should answer with a 503 and a Retry-After header.
+    """
+
+    def __init__(self, message, retry_after=1):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class _Timings:
+    def __init__(self, size=1000):
+        self._samples = deque(maxlen=size)
+        self.count = 0
+        self.total = 0.0
+
+    def add(self, seconds):
+        self._samples.append(seconds)
+        self.count += 1
+        self.total += seconds
+
+    def to_json(self):
+        samples = sorted(self._samples)
+
+        def pick(p):
+            if not samples:
+                return None
+            return round(samples[min(len(samples) - 1, int(p * len(samples)))] * 1000, 3)
+        return {
+            'count': self.count,
+            'mean_ms': round(self.total / self.count * 1000, 3) if self.count else None,
+            'p50_ms': pick(0.5),
+            'p95_ms': pick(0.95),
+            'max_ms': pick(1),
+        }
+
+
+class PasswordPool:
+    """
+    Runs argon2 hashing and verification on a small dedicated pool of threads
+    (argon2-cffi releases the GIL while it hashes) so a burst of logins can't
+    pin every request thread. At most workers + queue_size calls are accepted,
+    past that PoolBusy is raised straight away, and a call waiting longer than
+    timeout seconds raises PoolBusy too.
+    """
+
+    def __init__(self, hasher, workers=2, queue_size=16, timeout=5, retry_after=1):
+        self.hasher = hasher
+        self.workers = workers
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self.retry_after = retry_after
+        self._pool = ThreadPoolExecutor(workers, thread_name_prefix='argon2')
+        self._slots = threading.BoundedSemaphore(workers + queue_size)
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._running = 0
+        self._rejected = 0
+        self._timeouts = 0
+        self._wait = _Timings()
+        self._hash = _Timings()
+
+    def _call(self, submitted, fn, args):
+        started = time.perf_counter()
+        with self._lock:
+            self._queued -= 1
+            self._running += 1
+            self._wait.add(started - submitted)
+        try:
+            return fn(*args)
+        finally:
+            with self._lock:
+                self._running -= 1
+                self._hash.add(time.perf_counter() - started)
+
+    def _run(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._rejected += 1
+            raise PoolBusy('Too many password requests, try again later.', self.retry_after)
+        with self._lock:
+            self._queued += 1
+        future = self._pool.submit(self._call, time.perf_counter(), fn, args)
+        future.add_done_callback(lambda f: self._slots.release())
+        try:
+            return future.result(self.timeout)
+        except TimeoutError:
+            if future.cancel():
+                with self._lock:
+                    self._queued -= 1
+            with self._lock:
+                self._timeouts += 1
+            raise PoolBusy('Password hashing timed out, try again later.', self.retry_after)
+
+    def hash(self, password):
+        return self._run(self.hasher.hash, password)
+
+    def verify(self, hash, password):
+        return self._run(self.hasher.verify, hash, password)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'workers': self.workers,
+                'queue_size': self.queue_size,
+                'running': self._running,
+                'queued': self._queued,
+                'rejected': self._rejected,
+                'timeouts': self._timeouts,
+                'queue_wait': self._wait.to_json(),
+                'hash_time': self._hash.to_json(),
+                'parameters': {
+                    'time_cost': self.hasher.time_cost,
+                    'memory_cost': self.hasher.memory_cost,
+                    'parallelism': self.hasher.parallelism,
+                },
+            }
+
+
+_worker_hasher = None
+
+
+def _init_worker(parameters):
+    global _worker_hasher
+    _worker_hasher = PasswordHasher(**parameters)
+
+
+def _hash(password):
+    return _worker_hasher.hash(password)
+
+
+class BulkHasher:
+    """
+    Hashes lists of passwords on a pool of processes with the same argon2
+    settings as hasher, for bulk imports that would otherwise queue thousands
+    of hashes behind the login pool. The processes are started on first use.
+    """
+
+    def __init__(self, hasher, workers=None):
+        self.workers = workers or os.cpu_count() or 1
+        self.parameters = {
+            'time_cost': hasher.time_cost,
+            'memory_cost': hasher.memory_cost,
+            'parallelism': hasher.parallelism,
+            'hash_len': hasher.hash_len,
+            'salt_len': hasher.salt_len,
+            'type': hasher.type,
+        }
+        self._lock = threading.Lock()
+        self._pool = None
+
+    def _get_pool(self):
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(
+                    self.workers, initializer=_init_worker, initargs=(self.parameters,))
+            return self._pool
+
+    def hash_many(self, passwords):
+        if not passwords:
+            return []
+        chunksize = max(1, len(passwords) // (self.workers * 4))
+        return list(self._get_pool().map(_hash, passwords, chunksize=chunksize))
+
+    def shutdown(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown()
+                self._pool = None
@@ -0,0 +1,73 @@
+"""
+Benchmarks argon2 PasswordHasher cost settings on this machine and recommends
+the strongest ones that still hash within the target latency.
+
+    python -m passwords.calibrate --target-ms 250
+    python -m passwords.calibrate --target-ms 100 --parallelism 2 --samples 5
+
+Put the recommendation in app/__init__.py (ARGON2_TIME_COST, ARGON2_MEMORY_COST
+and ARGON2_PARALLELISM). Existing hashes are upgraded the next time the user
+logs in.
+"""
+import argparse
+import json
+import os
+import statistics
+import time
+
+from argon2 import PasswordHasher
+
+MEMORY_COSTS = (19456, 32768, 47104, 65536, 131072, 262144)  # KiB
+TIME_COSTS = (1, 2, 3, 4, 6, 8)
+
+
+def measure(time_cost, memory_cost, parallelism, samples):
+    hasher = PasswordHasher(time_cost=time_cost, memory_cost=memory_cost, parallelism=parallelism)
+    hasher.hash('warm up')
+    timings = []
+    for _ in range(samples):
+        start = time.perf_counter()
+        hasher.hash('correct horse battery staple')
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='python -m passwords.calibrate', description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--target-ms', type=float, default=250, help='latency budget for one hash')
+    parser.add_argument('--parallelism', type=int, default=min(os.cpu_count() or 1, 4))
+    parser.add_argument('--samples', type=int, default=3)
+    args = parser.parse_args()
+
+    results = []
+    for memory_cost in MEMORY_COSTS:
+        for time_cost in TIME_COSTS:
+            ms = measure(time_cost, memory_cost, args.parallelism, args.samples)
+            results.append({'time_cost': time_cost, 'memory_cost': memory_cost, 'ms': round(ms, 2)})
+            print(f'time_cost={time_cost:<2} memory_cost={memory_cost:<7} {ms:9.2f} ms')
+            if ms > args.target_ms:
+                # a higher time cost with the same memory will only be slower
+                break
+
+    """
+    Memory hardness is what makes argon2 expensive to attack, so prefer the
+    most memory and then the most passes that fit in the budget.
+    """
+    within = [r for r in results if r['ms'] <= args.target_ms]
+    if not within:
+        print(f'Even the cheapest setting is slower than {args.target_ms} ms, use '
+              f'time_cost=1 memory_cost={MEMORY_COSTS[0]} or add more cpu.')
+        return
+    best = max(within, key=lambda r: (r['memory_cost'], r['time_cost']))
+    print(json.dumps({
+        'ARGON2_TIME_COST': best['time_cost'],
+        'ARGON2_MEMORY_COST': best['memory_cost'],
+        'ARGON2_PARALLELISM': args.parallelism,
+        'hash_ms': best['ms'],
+        'target_ms': args.target_ms,
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,172 @@
+import math
+import threading
+import time
+from hashlib import blake2b
+
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import sessionmaker
+
+
+class BloomFilter:
+    """
+    Fixed size Bloom filter: `in` is never wrong for keys that were added and
+    wrong for about error_rate of the keys that were not.
+    """
+
+    def __init__(self, capacity=100000, error_rate=0.001):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _hashes(self, key):
+        digest = blake2b(key.encode(), digest_size=16).digest()
+        return int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little') | 1
+
+    def add(self, key):
+        h1, h2 = self._hashes(key)
+        for i in range(self.hashes):
+            position = (h1 + i * h2) % self.size
+            self._bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, key):
+        h1, h2 = self._hashes(key)
+        bits, size = self._bits, self.size
+        for i in range(self.hashes):
+            position = (h1 + i * h2) % size
+            if not bits[position >> 3] & (1 << (position & 7)):
+                return False
+        return True
+
+
+class TableStore:
+    """
+    Revoked token ids kept in a database table, so a logout on one process
+    is seen by every other process and survives a restart. model is a mapped
+    class with an autoincrementing `id`, a unique `jti` and `exp` (a unix
+    timestamp, indexed for pruning); the ids let a process fetch only the
+    rows added since it last looked.
+
+    Every call uses a session of its own on engine, so checking a token
+    during a request never flushes or commits the request's session.
+    """
+
+    def __init__(self, engine, model):
+        self.model = model
+        self.Session = sessionmaker(engine)
+
+    def add(self, jti, exp):
+        with self.Session() as session:
+            session.add(self.model(jti, exp))
+            try:
+                session.commit()
+            except IntegrityError:
+                # already revoked
+                session.rollback()
+
+    def get(self, jti):
+        with self.Session() as session:
+            row = session.query(self.model.exp).filter_by(jti=jti).first()
+        return row.exp if row else None
+
+    def since(self, last_id):
+        """
+        (id, jti) of the rows added after last_id, in order.
+        """
+        with self.Session() as session:
+            return session.query(self.model.id, self.model.jti).filter(
+                self.model.id > last_id
+            ).order_by(self.model.id).all()
+
+    def prune(self, now):
+        with self.Session() as session:
+            session.query(self.model).filter(self.model.exp <= now).delete(synchronize_session=False)
+            session.commit()
+
+
+class RevocationList:
+    """
+    Revoked token ids (the `jti` claim). The exact list lives in store (a
+    TableStore) and every process keeps a Bloom filter of it, so the common
+    case (a token that was never revoked) is a few hashes and bit tests and
+    only a filter hit costs a query.
+
+    The filter is built from the store when the process first checks a token
+    and picks up the ids revoked by other processes at most every
+    sync_interval seconds. Ids are kept until the token would have expired
+    anyway: a logout deletes the expired rows at most every prune_interval
+    seconds, so checking a token only ever reads the store, and every
+    prune_interval seconds the filter is rebuilt from the rows left, since a
+    Bloom filter can't forget keys.
+    """
+
+    def __init__(self, store, capacity=100000, error_rate=0.001, sync_interval=1, prune_interval=600):
+        self.store = store
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.sync_interval = sync_interval
+        self.prune_interval = prune_interval
+        self._lock = threading.Lock()
+        self._filter = None
+        self._count = 0
+        self._last_id = 0
+        self._next_sync = 0
+        self._next_rebuild = 0
+        self._next_prune = 0
+
+    def revoke(self, jti, exp):
+        """
+        Revokes jti until exp (a unix timestamp).
+        """
+        self.store.add(jti, exp)
+        now = time.monotonic()
+        with self._lock:
+            if self._filter is not None:
+                self._filter.add(jti)
+            prune = now >= self._next_prune
+            if prune:
+                self._next_prune = now + self.prune_interval
+        if prune:
+            self.store.prune(time.time())
+
+    def is_revoked(self, jti):
+        if not jti:
+            return False
+        self._refresh()
+        if jti not in self._filter:
+            return False
+        exp = self.store.get(jti)
+        return exp is not None and exp > time.time()
+
+    def _refresh(self):
+        now = time.monotonic()
+        if now < self._next_sync:
+            return
+        with self._lock:
+            if now >= self._next_rebuild or self._count > self.capacity:
+                self._rebuild()
+            elif now >= self._next_sync:
+                self._sync()
+
+    def _sync(self):
+        for row_id, jti in self.store.since(self._last_id):
+            self._filter.add(jti)
+            self._last_id = row_id
+            self._count += 1
+        self._next_sync = time.monotonic() + self.sync_interval
+
+    def _rebuild(self):
+        self._filter = BloomFilter(self.capacity, self.error_rate)
+        self._count = self._last_id = 0
+        self._sync()
+        if self._count > self.capacity:
+            # more revocations than the filter was sized for, grow it
+            self.capacity = 2 * self._count
+            self._filter = BloomFilter(self.capacity, self.error_rate)
+            self._count = self._last_id = 0
+            self._sync()
+        self._next_rebuild = time.monotonic() + self.prune_interval
+
+    def __len__(self):
+        return self._count